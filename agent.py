@@ -1,4 +1,7 @@
+from code_int_mcp.lifecycle import current_runtime_session
+from code_int_mcp.models import session_id_from_result_text
 from code_int_mcp.server import code_int_mcp_server
+from code_int_mcp.streaming import output_bus
 from browser_mcp.server import browser_mcp_server
 from claude_agent_sdk import (
     AgentDefinition,
@@ -10,16 +13,34 @@ from claude_agent_sdk import (
     ToolUseBlock,
     ClaudeSDKClient,
     ToolResultBlock,
+    query as sdk_query,
 )
 from bedrock_agentcore.runtime import BedrockAgentCoreApp
 from bedrock_agentcore.memory import MemorySessionManager
 from bedrock_agentcore.memory.constants import ConversationalMessage, MessageRole
+from memory_rerank import HashingEmbedder, rerank_memories
+from memory_utils import (
+    BackgroundDigestCache,
+    LRUCache,
+    MemoryStrategyRegistry,
+    SearchResultCache,
+    STMBuffer,
+    WriteBehindQueue,
+    assemble_memory_context,
+    heuristic_memory_queries,
+    needs_llm_queries,
+    normalize_query,
+    summarize_turn,
+)
+import asyncio
+import hashlib
 import logging
 import json
 import os
 import re
+import time
 import requests
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 # Logging setup
 logging.basicConfig(level=logging.INFO)
@@ -31,6 +52,63 @@ EPISODIC_MEMORY_CONFIG = {
     "total_max_results": 6,            # Hard cap on total episodic memories
     "min_relevance_score": 0.3,        # Threshold for inclusion
     "max_context_chars": 2000,         # Max characters in episodic context
+    "max_concurrent_searches": 4,      # Parallel namespace searches in flight
+    "record_cache_max_entries": 2048,  # Parsed/rendered records cached by memoryRecordId
+    "debug_log_sample": 3,             # Per-record debug log lines per request
+    "digest_scan_records": 100,        # Actor records scanned per digest refresh
+    "digest_max_items": 6,             # Reflections/patterns kept in the actor digest
+    "digest_score": 0.6,               # Relevance assigned to the top digest item
+    "digest_refresh_seconds": 300,     # Background refresh interval per active actor
+}
+
+# Memory context assembly configuration (single budget across STM, LTM and episodic)
+MEMORY_CONTEXT_CONFIG = {
+    "max_tokens": 2000,                # Estimated-token budget for all memory sections combined
+    "dedupe_similarity": 0.8,          # Term overlap at which LTM/episodic facts are duplicates
+    "stm_recency_decay": 0.85,         # STM turn score = decay ** turns_ago
+    # Retrieval deadline; stages still running when it expires are cancelled (0 disables)
+    "latency_budget_ms": int(os.environ.get("MEMORY_LATENCY_BUDGET_MS", "300")),
+}
+
+# Local reranking of LTM and episodic candidates (hashing embedder, no network)
+RERANK_CONFIG = {
+    "enabled": True,
+    "dim": 1024,                       # Hashing embedder dimensions
+    "similarity_weight": 0.7,          # Blend: weight * local similarity + rest * service score
+    "vector_cache_max_entries": 4096,  # Cached record vectors keyed by memoryRecordId
+}
+
+# Memory section headers in the system prompt
+STM_HEADER = "\n## CONVERSATION HISTORY:"
+STM_SUMMARY_LABEL = "Earlier in this conversation (summary):"
+LTM_HEADER = "\n## RELEVANT MEMORIES (Facts about user):"
+EPISODIC_HEADER = "\n## EPISODIC MEMORIES (Learned Patterns & Insights):"
+
+# Memory query generation configuration
+QUERY_GENERATION_CONFIG = {
+    "max_queries": 3,                  # Generated queries (in addition to the prompt)
+    "llm_min_words": 60,               # Prompts this long go to the model
+    # Refine long/ambiguous prompts' queries with the model in the background (off by default)
+    "llm_background": os.environ.get("MEMORY_LLM_QUERIES", "0") == "1",
+    "cache_max_entries": 1024,         # LRU bound on cached query sets
+    "cache_ttl_seconds": 3600,         # Expire cached query sets after this long
+}
+
+# Memory cache configuration (process-wide)
+MEMORY_CACHE_CONFIG = {
+    "strategy_ttl_seconds": 600,           # Strategy IDs almost never change
+    "strategy_negative_ttl_seconds": 60,   # Retry sooner after a failed listing
+    "search_cache_max_entries": 512,       # LRU bound on cached LTM searches
+    "search_cache_max_bytes": 4 * 1024 * 1024,  # Approximate size bound
+    "search_cache_ttl_seconds": 120,       # Expire cached searches after this long
+    "stm_fetch_turns": 10,                 # Turns read from the backend on a cold miss
+    "stm_window_turns": 4,                 # Recent turns kept verbatim per session
+    "stm_summary_max_lines": 20,           # Older turns folded into a rolling summary
+    "stm_buffer_max_sessions": 1000,       # LRU bound on buffered sessions
+    "stm_buffer_idle_ttl_seconds": 1800,   # Evict sessions idle this long
+    "write_queue_max_size": 1000,          # Pending turn writes before falling back inline
+    "write_queue_max_retries": 3,          # Retries per turn write
+    "write_queue_backoff_seconds": 0.5,    # Base delay for exponential backoff
 }
 
 # AgentCore Gateway Configuration
@@ -50,8 +128,6 @@ def get_gateway_auth_token() -> str:
     Retrieve Bearer token for AgentCore Gateway via Cognito OAuth2 client_credentials flow.
     Caches the token until near expiry.
     """
-    import time
-
     # Check cache first (with 60s buffer before expiry)
     if _gateway_token_cache["token"] and time.time() < _gateway_token_cache["expires_at"] - 60:
         logger.info("Using cached gateway token")
@@ -91,6 +167,58 @@ app = BedrockAgentCoreApp()
 # Global cache for memory session manager
 _memory_session_manager = None
 
+# Global registry of memory strategy IDs (one listing per memory ID per TTL)
+_strategy_registry = MemoryStrategyRegistry(
+    ttl_seconds=MEMORY_CACHE_CONFIG["strategy_ttl_seconds"],
+    negative_ttl_seconds=MEMORY_CACHE_CONFIG["strategy_negative_ttl_seconds"],
+)
+
+# Global LRU+TTL cache of long-term memory search results
+_search_cache = SearchResultCache(
+    max_entries=MEMORY_CACHE_CONFIG["search_cache_max_entries"],
+    max_bytes=MEMORY_CACHE_CONFIG["search_cache_max_bytes"],
+    ttl_seconds=MEMORY_CACHE_CONFIG["search_cache_ttl_seconds"],
+)
+
+# Global cache of generated memory queries keyed by prompt hash
+_query_cache = LRUCache(
+    max_entries=QUERY_GENERATION_CONFIG["cache_max_entries"],
+    ttl_seconds=QUERY_GENERATION_CONFIG["cache_ttl_seconds"],
+)
+
+# Global hashing embedder with cached per-record vectors for local reranking
+_embedder = HashingEmbedder(
+    dim=RERANK_CONFIG["dim"],
+    cache_max_entries=RERANK_CONFIG["vector_cache_max_entries"],
+)
+
+# Global cache of parsed episodic records and their rendered lines, keyed by memoryRecordId
+_episodic_record_cache = LRUCache(max_entries=EPISODIC_MEMORY_CONFIG["record_cache_max_entries"])
+
+# Global write-through buffer of recent turns (plus rolling summary) per (actor, session)
+_stm_buffer = STMBuffer(
+    max_turns=MEMORY_CACHE_CONFIG["stm_window_turns"],
+    max_sessions=MEMORY_CACHE_CONFIG["stm_buffer_max_sessions"],
+    idle_ttl_seconds=MEMORY_CACHE_CONFIG["stm_buffer_idle_ttl_seconds"],
+    summarizer=summarize_turn,
+    summary_max_lines=MEMORY_CACHE_CONFIG["stm_summary_max_lines"],
+)
+
+
+def use_local_memory() -> bool:
+    """True when MEMORY_BACKEND=local selects the SQLite stand-in (see local_memory.py)."""
+    return os.environ.get("MEMORY_BACKEND", "agentcore").lower() == "local"
+
+
+def get_memory_id() -> str:
+    """Return the configured AgentCore Memory ID."""
+    memory_id = os.environ.get("BEDROCK_AGENTCORE_MEMORY_ID")
+    if not memory_id and use_local_memory():
+        return "local"
+    if not memory_id:
+        raise ValueError("BEDROCK_AGENTCORE_MEMORY_ID not set")
+    return memory_id
+
 
 def get_memory_session_manager() -> MemorySessionManager:
     """Lazy-initialize and cache the memory session manager."""
@@ -99,9 +227,14 @@ def get_memory_session_manager() -> MemorySessionManager:
     if _memory_session_manager is not None:
         return _memory_session_manager
 
-    memory_id = os.environ.get("BEDROCK_AGENTCORE_MEMORY_ID")
-    if not memory_id:
-        raise ValueError("BEDROCK_AGENTCORE_MEMORY_ID not set")
+    memory_id = get_memory_id()
+
+    if use_local_memory():
+        from local_memory import LocalMemorySessionManager
+
+        _memory_session_manager = LocalMemorySessionManager.from_env(memory_id)
+        logger.info(f"Using local SQLite memory backend: {_memory_session_manager.db_path}")
+        return _memory_session_manager
 
     _memory_session_manager = MemorySessionManager(
         memory_id=memory_id,
@@ -110,48 +243,94 @@ def get_memory_session_manager() -> MemorySessionManager:
     return _memory_session_manager
 
 
-def get_stm_context(manager: MemorySessionManager, actor_id: str, session_id: str, k: int = 10) -> str:
-    """Retrieve STM (conversation history) formatted for system prompt."""
+def get_stm_turns(manager: MemorySessionManager, actor_id: str, session_id: str, k: int = 10) -> List[List[str]]:
+    """Retrieve recent turns (oldest first) as lists of 'User: ...' / 'Assistant: ...' lines.
+
+    Served from the in-process STM buffer; the remote backend is only read on a cold miss.
+    Only the verbatim window is returned; older turns are in get_stm_summary().
+    """
     try:
-        turns = manager.get_last_k_turns(actor_id=actor_id, session_id=session_id, k=k)
+        turns = _stm_buffer.get(actor_id, session_id, k)
+        if turns is None:
+            turns = manager.get_last_k_turns(
+                actor_id=actor_id, session_id=session_id, k=MEMORY_CACHE_CONFIG["stm_fetch_turns"]
+            )
+            _stm_buffer.seed(actor_id, session_id, turns)
+            turns = _stm_buffer.get(actor_id, session_id, k)
         if not turns:
-            return ""
+            return []
 
         history = []
         for turn in turns:
+            lines = []
             for msg in turn:
                 role = msg.get('role', 'unknown')
                 text = msg.get('content', {}).get('text', '')
                 if text:
                     label = "User" if role.lower() in ['user', 'human'] else "Assistant"
-                    history.append(f"{label}: {text}")
-
-        if not history:
-            return ""
-
-        return "\n## CONVERSATION HISTORY:\n" + "\n".join(history) + "\n"
+                    lines.append(f"{label}: {text}")
+            if lines:
+                history.append(lines)
+        return history
 
     except Exception as e:
         logger.warning("Failed to get STM: %s", e)
+        return []
+
+
+def get_stm_summary(actor_id: str, session_id: str) -> str:
+    """Rolling summary of turns older than the STM window (empty if none)."""
+    lines = _stm_buffer.summary(actor_id, session_id)
+    if not lines:
+        return ""
+    return STM_SUMMARY_LABEL + "\n" + "\n".join(f"- {line}" for line in lines)
+
+
+def get_stm_context(manager: MemorySessionManager, actor_id: str, session_id: str, k: int = 10) -> str:
+    """Retrieve STM (conversation history) formatted for system prompt."""
+    history = [line for lines in get_stm_turns(manager, actor_id, session_id, k) for line in lines]
+    summary = get_stm_summary(actor_id, session_id)
+    if summary:
+        history.insert(0, summary)
+    if not history:
         return ""
+    return STM_HEADER + "\n" + "\n".join(history) + "\n"
+
+
+def search_memories(
+    manager: MemorySessionManager,
+    actor_id: str,
+    query: str,
+    namespace: str,
+    top_k: int,
+) -> List[dict]:
+    """Search long-term memory, serving repeated (namespace, query, top_k) lookups from cache."""
+    key = SearchResultCache.make_key(namespace, query, top_k)
+    cached = _search_cache.get(key)
+    if cached is not None:
+        return cached
+
+    start = time.perf_counter()
+    memories = manager.search_long_term_memories(
+        query=query,
+        namespace_prefix=namespace,
+        top_k=top_k
+    )
+    _search_cache.put(key, actor_id, memories, time.perf_counter() - start)
+    return memories
 
 
 def get_semantic_strategy_id(manager: MemorySessionManager) -> Optional[str]:
-    """Find the semantic strategy ID by listing memory records."""
+    """Find the semantic strategy ID via the cached strategy registry."""
     try:
-        records = manager.list_long_term_memory_records(namespace_prefix="/", max_results=30)
-        for rec in records:
-            strategy_id = rec.get('memoryStrategyId', '')
-            if 'semantic' in strategy_id.lower():
-                return strategy_id
-        return None
+        return _strategy_registry.get_strategy_id(manager, get_memory_id(), "semantic")
     except Exception as e:
         logger.warning("Failed to find semantic strategy: %s", e)
         return None
 
 
-def get_ltm_context(manager: MemorySessionManager, actor_id: str, query: str, top_k: int = 5) -> str:
-    """Search LTM (semantic memory) and format results for system prompt."""
+def get_ltm_memories(manager: MemorySessionManager, actor_id: str, query: str, top_k: int = 5) -> List[dict]:
+    """Search LTM (semantic memory) and return [{'text', 'score'}] in service rank order."""
     try:
         # First try to find semantic strategy and use proper namespace
         semantic_strategy_id = get_semantic_strategy_id(manager)
@@ -164,43 +343,35 @@ def get_ltm_context(manager: MemorySessionManager, actor_id: str, query: str, to
             namespace = f"/users/{actor_id}/facts"
             logger.info(f"No semantic strategy found, using fallback namespace: {namespace}")
 
-        memories = manager.search_long_term_memories(
-            query=query,
-            namespace_prefix=namespace,
-            top_k=top_k
-        )
-
-        if not memories:
-            return ""
+        memories = search_memories(manager, actor_id, query, namespace, top_k)
 
         relevant = []
-        for m in memories:
+        for m in memories or []:
             text = m.get('content', {}).get('text', '')
             # API returns 'score', not 'relevanceScore'
             score = m.get('score', m.get('relevanceScore', 0))
             logger.info(f"LTM memory score: {score}, text preview: {text[:100] if text else 'empty'}")
             if text and score >= 0:
-                relevant.append(f"- {text}")
-
-        if not relevant:
-            return ""
-
-        return "\n## RELEVANT MEMORIES (Facts about user):\n" + "\n".join(relevant) + "\n"
+                relevant.append({'text': text, 'score': score, 'memoryRecordId': m.get('memoryRecordId', '')})
+        return relevant
 
     except Exception as e:
         logger.warning("Failed to search LTM: %s", e)
+        return []
+
+
+def get_ltm_context(manager: MemorySessionManager, actor_id: str, query: str, top_k: int = 5) -> str:
+    """Search LTM (semantic memory) and format results for system prompt."""
+    relevant = get_ltm_memories(manager, actor_id, query, top_k)
+    if not relevant:
         return ""
+    return LTM_HEADER + "\n" + "\n".join(f"- {m['text']}" for m in relevant) + "\n"
 
 
 def get_episodic_strategy_id(manager: MemorySessionManager) -> Optional[str]:
-    """Find the episodic strategy ID by listing memory records and extracting strategy IDs."""
+    """Find the episodic strategy ID via the cached strategy registry."""
     try:
-        records = manager.list_long_term_memory_records(namespace_prefix="/", max_results=20)
-        for rec in records:
-            strategy_id = rec.get('memoryStrategyId', '')
-            if 'episodic' in strategy_id.lower():
-                return strategy_id
-        return None
+        return _strategy_registry.get_strategy_id(manager, get_memory_id(), "episodic")
     except Exception as e:
         logger.warning("Failed to find episodic strategy: %s", e)
         return None
@@ -222,62 +393,88 @@ def parse_episodic_content(content_text: str) -> dict:
         return {'_type': 'TEXT', 'text': content_text}
 
 
+def get_parsed_episodic_record(m: dict, text: str) -> dict:
+    """Return {'parsed', 'line'} for a record, reusing the cached entry when its text is unchanged."""
+    mem_id = m.get('memoryRecordId', '')
+    cached = _episodic_record_cache.get(mem_id) if mem_id else None
+    if cached is not None and cached['text'] == text:
+        return cached
+
+    parsed = parse_episodic_content(text)
+    entry = {'text': text, 'parsed': parsed, 'line': format_episodic_line(parsed)}
+    if mem_id:
+        _episodic_record_cache.put(mem_id, entry)
+    return entry
+
+
 def filter_and_score_episodic(
     memories: List[dict],
     min_score: float
 ) -> List[dict]:
-    """Filter episodic memories by relevance score and parse content."""
+    """Filter episodic memories by relevance score and parse content.
+
+    Parsed content and the rendered context line come from the per-record cache,
+    so repeat records skip JSON decoding and formatting.
+    """
     filtered = []
-    for m in memories:
+    sample = EPISODIC_MEMORY_CONFIG["debug_log_sample"]
+    debug = logger.isEnabledFor(logging.DEBUG)
+    for i, m in enumerate(memories):
         # API returns 'score', not 'relevanceScore'
         score = m.get('score', m.get('relevanceScore', 0))
-        logger.info(f"Episodic memory score: {score}, keys: {list(m.keys())}")
         if score < min_score:
-            logger.info(f"Filtering out memory with score {score} < {min_score}")
             continue
 
         content = m.get('content', {})
         text = content.get('text', '') if isinstance(content, dict) else str(content)
-        logger.info(f"Memory content text (first 200 chars): {text[:200]}")
-        parsed = parse_episodic_content(text)
+        if debug and i < sample:
+            logger.debug(f"Episodic memory score: {score}, text (first 200 chars): {text[:200]}")
+        record = get_parsed_episodic_record(m, text)
 
         filtered.append({
+            'memoryRecordId': m.get('memoryRecordId', ''),
             'score': score,
-            'parsed': parsed,
+            'parsed': record['parsed'],
+            'line': record['line'],
             'namespaces': m.get('namespaces', []),
             'strategy_id': m.get('memoryStrategyId', '')
         })
 
-    logger.info(f"Filtered episodic memories: {len(filtered)} of {len(memories)}")
+    logger.info(f"Filtered episodic memories: {len(filtered)} of {len(memories)} (min score {min_score})")
     return sorted(filtered, key=lambda x: x['score'], reverse=True)
 
 
+def format_episodic_line(parsed: dict) -> str:
+    """Render one parsed episodic memory as a system prompt line."""
+    mem_type = parsed.get('_type', 'UNKNOWN')
+
+    if mem_type == 'REFLECTION':
+        title = parsed.get('title', 'Untitled')
+        use_cases = parsed.get('use_cases', '')[:150]
+        hints = parsed.get('hints', '')
+        line = f"- [Insight] {title}: {use_cases}"
+        if hints:
+            line += f" (Hint: {hints[:50]})"
+    elif mem_type == 'LEARNED_PATTERN':
+        situation = parsed.get('situation', '')[:100]
+        intent = parsed.get('intent', '')[:100]
+        reflection = parsed.get('reflection', '')[:100]
+        line = f"- [Pattern] Situation: {situation}... Intent: {intent}... Lesson: {reflection}"
+    else:
+        line = f"- [Memory] {str(parsed)[:150]}"
+    return line
+
+
 def format_episodic_context(memories: List[dict], max_chars: int) -> str:
     """Format episodic memories for injection into system prompt."""
     if not memories:
         return ""
 
-    lines = ["\n## EPISODIC MEMORIES (Learned Patterns & Insights):"]
+    lines = [EPISODIC_HEADER]
     char_count = len(lines[0])
 
     for m in memories:
-        parsed = m.get('parsed', {})
-        mem_type = parsed.get('_type', 'UNKNOWN')
-
-        if mem_type == 'REFLECTION':
-            title = parsed.get('title', 'Untitled')
-            use_cases = parsed.get('use_cases', '')[:150]
-            hints = parsed.get('hints', '')
-            line = f"- [Insight] {title}: {use_cases}"
-            if hints:
-                line += f" (Hint: {hints[:50]})"
-        elif mem_type == 'LEARNED_PATTERN':
-            situation = parsed.get('situation', '')[:100]
-            intent = parsed.get('intent', '')[:100]
-            reflection = parsed.get('reflection', '')[:100]
-            line = f"- [Pattern] Situation: {situation}... Intent: {intent}... Lesson: {reflection}"
-        else:
-            line = f"- [Memory] {str(parsed)[:150]}"
+        line = m.get('line') or format_episodic_line(m.get('parsed', {}))
 
         if char_count + len(line) > max_chars:
             break
@@ -288,12 +485,11 @@ def format_episodic_context(memories: List[dict], max_chars: int) -> str:
     return "\n".join(lines) + "\n"
 
 
-async def generate_memory_queries(prompt: str, model_name: str) -> List[str]:
+async def _generate_llm_queries(prompt: str, model_name: str, max_queries: int) -> Optional[List[str]]:
     """
-    Generate a few short free-form search queries to improve memory recall.
+    Generate a few short free-form search queries with a lightweight model pass.
 
-    This is part of the agent flow (a lightweight internal model pass), not a tool call.
-    If parsing fails for any reason, falls back to [prompt].
+    Returns None if the call or parsing fails.
     """
     system = """You generate search queries to retrieve relevant user memories.
 Return ONLY valid JSON: {"queries": [..]}.
@@ -306,40 +502,175 @@ Rules:
     user_message = f"User message:\n{prompt}\n\nJSON:"
 
     try:
-        options = ClaudeAgentOptions(model=model_name)
-        async with ClaudeSDKClient(options=options) as client:
-            resp = await client.messages.create(
-                messages=[UserMessage(content=[TextBlock(text=user_message)])],
-                system=system,
-                max_tokens=200,
-            )
-
+        # One tool-less turn through the SDK's one-shot query(); only the reply text is used
+        options = ClaudeAgentOptions(model=model_name, system_prompt=system, max_turns=1, allowed_tools=[])
         text = ""
-        for block in resp.content:
-            if isinstance(block, TextBlock):
-                text += block.text
-
-        data = json.loads(text.strip())
+        async for message in sdk_query(prompt=user_message, options=options):
+            if isinstance(message, AssistantMessage):
+                for block in message.content:
+                    if isinstance(block, TextBlock):
+                        text += block.text
+
+        text = text.strip()
+        if text.startswith("```"):
+            text = text.strip("`").removeprefix("json").strip()
+        data = json.loads(text)
         queries = [q.strip() for q in data.get("queries", []) if isinstance(q, str) and q.strip()]
 
-        logger.info(f"Generated {len(queries)} memory queries: {queries[:3]}")
-
-        # Always include the original prompt as the first query
-        return [prompt] + queries[:3]
+        logger.info(f"Generated {len(queries)} memory queries: {queries[:max_queries]}")
+        return queries[:max_queries]
 
     except Exception as e:
         logger.warning("Failed to generate memory queries: %s", e)
-        return [prompt]
+        return None
+
+
+# In-flight model query generations keyed by prompt hash; they outlive the request
+# that started them so the result still lands in _query_cache
+_pending_llm_queries: Dict[str, "asyncio.Task"] = {}
+
+
+async def _llm_memory_queries(prompt: str, model_name: str, heuristic: List[str], cache_key: str) -> List[str]:
+    """Model queries for `prompt` (the heuristic ones if the call fails), cached when done."""
+    try:
+        llm_queries = await _generate_llm_queries(prompt, model_name, QUERY_GENERATION_CONFIG["max_queries"])
+        # Cache the heuristic fallback too, so a failing model isn't retried per request
+        source = "llm" if llm_queries is not None else "heuristic fallback"
+        result = [prompt] + (llm_queries if llm_queries is not None else heuristic)
+        logger.info(f"Memory queries ({source}): {result[1:]}")
+        _query_cache.put(cache_key, result)
+        return result
+    finally:
+        _pending_llm_queries.pop(cache_key, None)
+
+
+async def generate_memory_queries(prompt: str, model_name: str) -> List[str]:
+    """
+    Generate a few short free-form search queries to improve memory recall.
 
+    Queries come from a deterministic keyword/entity extraction and never wait on
+    the model. With QUERY_GENERATION_CONFIG["llm_background"], long or ambiguous
+    prompts also start a background model call whose queries are cached by prompt
+    hash, so a repeat of the same prompt uses them. The original prompt is always
+    the first query.
+    """
+    max_queries = QUERY_GENERATION_CONFIG["max_queries"]
+    cache_key = hashlib.sha256(normalize_query(prompt).encode()).hexdigest()
+    cached = _query_cache.get(cache_key)
+    if cached is not None:
+        logger.info(f"Using cached memory queries: {cached[1:]}")
+        return cached
+
+    queries = heuristic_memory_queries(prompt, max_queries)
+    if not needs_llm_queries(prompt, queries, QUERY_GENERATION_CONFIG["llm_min_words"]):
+        logger.info(f"Memory queries (heuristic): {queries}")
+        result = [prompt] + queries
+        _query_cache.put(cache_key, result)
+        return result
+
+    if QUERY_GENERATION_CONFIG["llm_background"] and cache_key not in _pending_llm_queries:
+        _pending_llm_queries[cache_key] = asyncio.ensure_future(
+            _llm_memory_queries(prompt, model_name, queries, cache_key)
+        )
+    # Left uncached so a model result for this prompt can take its place
+    pending = cache_key in _pending_llm_queries
+    logger.info(f"Memory queries (heuristic{', model pending' if pending else ''}): {queries}")
+    return [prompt] + queries
 
-def get_episodic_context(
+
+async def _search_namespace(
+    manager: MemorySessionManager,
+    actor_id: str,
+    query: str,
+    namespace: str,
+    top_k: int,
+    semaphore: asyncio.Semaphore,
+) -> List[dict]:
+    """Run one blocking LTM search in a worker thread under a concurrency limit."""
+    async with semaphore:
+        return await asyncio.to_thread(
+            search_memories, manager, actor_id, query, namespace, top_k
+        )
+
+
+# Digest ranking weight by episodic record type
+_DIGEST_TYPE_WEIGHTS = {'REFLECTION': 1.0, 'LEARNED_PATTERN': 0.8}
+
+
+def build_episodic_digest(actor_id: str, previous: Optional[dict]) -> Optional[dict]:
+    """Build the precomputed episodic digest for an actor (runs on the background refresher).
+
+    Lists the actor's reflections and learned patterns across all sessions in one call,
+    ranks them by type and recency and keeps the top `digest_max_items` as pre-rendered
+    lines. If the set of record IDs is unchanged since `previous`, it is reused as-is.
+    """
+    config = EPISODIC_MEMORY_CONFIG
+    manager = get_memory_session_manager()
+    episodic_strategy_id = get_episodic_strategy_id(manager)
+    if not episodic_strategy_id:
+        return None
+
+    records = manager.list_long_term_memory_records(
+        namespace_prefix=f"/strategies/{episodic_strategy_id}/actors/{actor_id}",
+        max_results=config["digest_scan_records"],
+    )
+    record_ids = frozenset(r.get('memoryRecordId', '') for r in records)
+    if previous is not None and previous["record_ids"] == record_ids:
+        return previous
+
+    ranked = []
+    for position, m in enumerate(records):
+        content = m.get('content', {})
+        text = content.get('text', '') if isinstance(content, dict) else str(content)
+        record = get_parsed_episodic_record(m, text)
+        weight = _DIGEST_TYPE_WEIGHTS.get(record['parsed'].get('_type'))
+        if weight is None:
+            continue
+        # Listing order is newest first; earlier records win ties
+        ranked.append((weight, -position, m.get('memoryRecordId', ''), record))
+    ranked.sort(key=lambda r: (r[0], r[1]), reverse=True)
+
+    items = []
+    for rank, (_, _, mem_id, record) in enumerate(ranked[:config["digest_max_items"]]):
+        items.append({
+            'memoryRecordId': mem_id,
+            'score': round(config["digest_score"] * (0.95 ** rank), 4),
+            'parsed': record['parsed'],
+            'line': record['line'],
+        })
+
+    logger.info(f"Built episodic digest for actor_id={actor_id}: {len(items)} of {len(records)} records")
+    return {
+        "record_ids": record_ids,
+        "items": items,
+        "block": "\n".join(item['line'] for item in items),
+    }
+
+
+# Global per-actor episodic digests, refreshed in the background
+_episodic_digests = BackgroundDigestCache(
+    build_episodic_digest,
+    name="episodic-digest",
+    refresh_interval_seconds=EPISODIC_MEMORY_CONFIG["digest_refresh_seconds"],
+)
+
+
+async def get_episodic_memories(
     manager: MemorySessionManager,
     actor_id: str,
     session_id: str,
     queries: List[str],
     config: dict = None
-) -> str:
-    """Retrieve episodic memories from session and actor level namespaces.
+) -> List[dict]:
+    """Retrieve scored, parsed episodic memories from session and actor level namespaces.
+
+    Actor-level memories come from the precomputed per-actor digest when it is ready;
+    live search then only covers the current session. Until the digest is built the
+    actor namespace is searched live as well.
+
+    All (query, namespace) searches are fanned out in parallel. Results are
+    deduplicated by memoryRecordId as they arrive, and searches still in flight
+    are cancelled once `total_max_results` qualifying records are collected.
 
     Args:
         manager: MemorySessionManager instance
@@ -352,91 +683,379 @@ def get_episodic_context(
         config = EPISODIC_MEMORY_CONFIG
 
     if not queries:
-        return ""
+        return []
 
     try:
         all_memories = []
         seen_ids = set()  # Deduplicate across queries
+        qualifying = 0
 
         # Find the episodic strategy ID
-        episodic_strategy_id = get_episodic_strategy_id(manager)
+        episodic_strategy_id = await asyncio.to_thread(get_episodic_strategy_id, manager)
         if not episodic_strategy_id:
             logger.info("No episodic strategy found, skipping episodic retrieval")
-            return ""
+            return []
 
         logger.info(f"Using episodic strategy: {episodic_strategy_id}")
 
+        # Actor-level namespace (reflections - cross-session patterns) and
+        # session-level namespace (episodes - specific interactions)
+        digest = _episodic_digests.get(actor_id)
+        namespaces = []
+        if digest is None:
+            namespaces.append(("Actor-level", f"/strategies/{episodic_strategy_id}/actors/{actor_id}"))
+        if session_id:
+            namespaces.append(
+                ("Session-level", f"/strategies/{episodic_strategy_id}/actors/{actor_id}/sessions/{session_id}")
+            )
+
         # Search with each query (limit to first 2 queries to control latency)
+        semaphore = asyncio.Semaphore(config["max_concurrent_searches"])
+        searches = {}
         for query in queries[:2]:
-            # Search actor-level namespace (reflections - cross-session patterns)
-            actor_namespace = f"/strategies/{episodic_strategy_id}/actors/{actor_id}"
-            try:
-                actor_mems = manager.search_long_term_memories(
-                    query=query,
-                    namespace_prefix=actor_namespace,
-                    top_k=config["max_results_per_namespace"]
-                )
-                for m in actor_mems:
-                    mem_id = m.get('memoryRecordId', '')
-                    if mem_id and mem_id not in seen_ids:
-                        seen_ids.add(mem_id)
-                        all_memories.append(m)
-            except Exception as e:
-                logger.warning(f"Actor-level search failed for query '{query[:30]}': {e}")
-
-            # Search session-level namespace (episodes - specific interactions)
-            if session_id:
-                session_namespace = f"/strategies/{episodic_strategy_id}/actors/{actor_id}/sessions/{session_id}"
-                try:
-                    session_mems = manager.search_long_term_memories(
-                        query=query,
-                        namespace_prefix=session_namespace,
-                        top_k=config["max_results_per_namespace"]
-                    )
-                    for m in session_mems:
+            for level, namespace in namespaces:
+                task = asyncio.create_task(_search_namespace(
+                    manager, actor_id, query, namespace, config["max_results_per_namespace"], semaphore
+                ))
+                searches[task] = (level, query)
+
+        pending = set(searches)
+        try:
+            while pending and qualifying < config["total_max_results"]:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    level, query = searches[task]
+                    try:
+                        mems = task.result()
+                    except Exception as e:
+                        logger.warning(f"{level} search failed for query '{query[:30]}': {e}")
+                        continue
+                    for m in mems:
                         mem_id = m.get('memoryRecordId', '')
                         if mem_id and mem_id not in seen_ids:
                             seen_ids.add(mem_id)
                             all_memories.append(m)
-                except Exception as e:
-                    logger.warning(f"Session-level search failed for query '{query[:30]}': {e}")
-
-            # Early exit if we have enough memories
-            if len(all_memories) >= config["total_max_results"]:
-                break
+                            if m.get('score', m.get('relevanceScore', 0)) >= config["min_relevance_score"]:
+                                qualifying += 1
+        finally:
+            # Early exit: cancel searches still in flight once we have enough memories
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.info(f"Cancelled {len(pending)} in-flight episodic searches")
 
         logger.info(f"Episodic search found {len(all_memories)} unique memories")
 
-        if not all_memories:
-            return ""
-
-        # Filter and format
-        filtered = filter_and_score_episodic(all_memories, config["min_relevance_score"])
-        truncated = filtered[:config["total_max_results"]]
-
-        return format_episodic_context(truncated, config["max_context_chars"])
+        filtered = filter_and_score_episodic(all_memories, config["min_relevance_score"]) if all_memories else []
+        if digest is not None:
+            filtered += [item for item in digest["items"] if item['memoryRecordId'] not in seen_ids]
+            filtered.sort(key=lambda x: x['score'], reverse=True)
+        return filtered[:config["total_max_results"]]
 
     except Exception as e:
         logger.warning("Failed to get episodic context: %s", e)
-        return ""
+        return []
+
+
+async def get_episodic_context(
+    manager: MemorySessionManager,
+    actor_id: str,
+    session_id: str,
+    queries: List[str],
+    config: dict = None
+) -> str:
+    """Retrieve episodic memories and format them for the system prompt."""
+    if config is None:
+        config = EPISODIC_MEMORY_CONFIG
+    memories = await get_episodic_memories(manager, actor_id, session_id, queries, config)
+    return format_episodic_context(memories, config["max_context_chars"])
+
+
+def _write_turn(item: dict):
+    """Persist one conversation turn (runs on the write-behind worker thread)."""
+    item["manager"].add_turns(
+        actor_id=item["actor_id"],
+        session_id=item["session_id"],
+        messages=[
+            ConversationalMessage(item["user_msg"], MessageRole.USER),
+            ConversationalMessage(item["assistant_msg"], MessageRole.ASSISTANT)
+        ]
+    )
+    logger.info("Stored conversation turn for actor_id=%s, session_id=%s", item["actor_id"], item["session_id"])
+    # New turns can change what long-term search returns for this actor
+    _search_cache.invalidate_actor(item["actor_id"])
+
+
+# Global write-behind queue for conversation turns
+_turn_write_queue = WriteBehindQueue(
+    _write_turn,
+    name="turn-writer",
+    max_size=MEMORY_CACHE_CONFIG["write_queue_max_size"],
+    max_retries=MEMORY_CACHE_CONFIG["write_queue_max_retries"],
+    backoff_seconds=MEMORY_CACHE_CONFIG["write_queue_backoff_seconds"],
+)
 
 
 async def store_turn(manager: MemorySessionManager, actor_id: str, session_id: str, user_msg: str, assistant_msg: str):
-    """Store conversation turn in STM."""
+    """Store conversation turn in STM.
+
+    The local STM buffer is updated immediately; the remote write is queued on the
+    write-behind worker. If the queue is full the turn is written inline instead.
+    """
+    _stm_buffer.append(actor_id, session_id, [
+        {"role": MessageRole.USER.value, "content": {"text": user_msg}},
+        {"role": MessageRole.ASSISTANT.value, "content": {"text": assistant_msg}},
+    ])
+    item = {
+        "manager": manager,
+        "actor_id": actor_id,
+        "session_id": session_id,
+        "user_msg": user_msg,
+        "assistant_msg": assistant_msg,
+    }
+    if _turn_write_queue.put(item):
+        return
     try:
-        manager.add_turns(
-            actor_id=actor_id,
-            session_id=session_id,
-            messages=[
-                ConversationalMessage(user_msg, MessageRole.USER),
-                ConversationalMessage(assistant_msg, MessageRole.ASSISTANT)
-            ]
-        )
-        logger.info("Stored conversation turn for actor_id=%s, session_id=%s", actor_id, session_id)
+        await asyncio.to_thread(_write_turn, item)
     except Exception as e:
         logger.warning("Failed to store turn: %s", e)
 
 
+def get_memory_metrics() -> dict:
+    """Snapshot of process-wide memory cache and write queue metrics."""
+    return {
+        "search_cache": _search_cache.stats(),
+        "stm_buffer_sessions": len(_stm_buffer),
+        "turn_write_queue": _turn_write_queue.stats(),
+        "query_cache": _query_cache.stats(),
+        "episodic_record_cache": _episodic_record_cache.stats(),
+        "episodic_digests": _episodic_digests.stats(),
+        "rerank_vectors": _embedder.stats(),
+    }
+
+
+async def _timed_stage(name: str, coro, timings: dict):
+    """Await a retrieval stage and record its wall-clock duration in milliseconds."""
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def build_memory_sections(
+    stm_turns: List[List[str]],
+    ltm_memories: List[dict],
+    episodic_memories: List[dict],
+    stm_summary: str = "",
+) -> List[dict]:
+    """Turn retrieved STM, LTM and episodic memories into scored sections for the assembler."""
+    decay = MEMORY_CONTEXT_CONFIG["stm_recency_decay"]
+    newest = len(stm_turns) - 1
+    # The newest turn is always kept (trimmed if it alone exceeds the budget)
+    stm_items = [
+        {"text": "\n".join(lines), "score": decay ** (newest - i), "order": i, "required": i == newest}
+        for i, lines in enumerate(stm_turns)
+    ]
+    if stm_summary:
+        # Rendered before the verbatim turns, scored just below the oldest of them
+        stm_items.append({"text": stm_summary, "score": decay ** len(stm_turns), "order": -1})
+    return [
+        {
+            "name": "stm",
+            "header": STM_HEADER,
+            "items": stm_items,
+        },
+        {
+            "name": "ltm",
+            "header": LTM_HEADER,
+            "dedupe": True,
+            "items": [
+                {"text": f"- {m['text']}", "score": m['score'], "order": i}
+                for i, m in enumerate(ltm_memories)
+            ],
+        },
+        {
+            "name": "episodic",
+            "header": EPISODIC_HEADER,
+            "dedupe": True,
+            "items": [
+                {"text": m['line'], "score": m['score'], "order": i}
+                for i, m in enumerate(episodic_memories)
+            ],
+        },
+    ]
+
+
+def rerank_retrieved(
+    prompt: str,
+    queries: List[str],
+    ltm_memories: List[dict],
+    episodic_memories: List[dict],
+) -> tuple:
+    """Rerank LTM and episodic candidates together against the prompt and queries.
+
+    Returns (ltm_memories, episodic_memories) rescored and ordered best first.
+    """
+    candidates = (
+        [{**m, 'source': 'ltm'} for m in ltm_memories]
+        + [{**m, 'text': m['line'], 'source': 'episodic'} for m in episodic_memories]
+    )
+    reranked = rerank_memories(
+        _embedder,
+        prompt,
+        queries,
+        candidates,
+        similarity_weight=RERANK_CONFIG["similarity_weight"],
+    )
+    return (
+        [m for m in reranked if m['source'] == 'ltm'],
+        [m for m in reranked if m['source'] == 'episodic'],
+    )
+
+
+async def retrieve_memory_context(
+    manager: MemorySessionManager,
+    actor_id: str,
+    session_id: str,
+    prompt: str,
+    model_name: str,
+) -> dict:
+    """Run all memory retrieval stages concurrently and assemble them into one token budget.
+
+    STM, LTM and query generation start together. The blocking MemorySessionManager
+    calls run in worker threads so the event loop stays free. Episodic search is
+    chained onto query generation and starts as soon as the queries arrive.
+
+    Retrieval is bounded by MEMORY_CONTEXT_CONFIG["latency_budget_ms"]: sections that
+    have not arrived by then are cancelled and the agent starts without them. A
+    pending model query generation is not cancelled (see generate_memory_queries).
+
+    Returns:
+        dict with 'stm', 'ltm', 'episodic' context strings, 'dropped' (timed out) and
+        'failed' ({name: error}) sections, assembler 'usage' and per-stage 'timings' (ms)
+    """
+    timings = {}
+    queries = []
+    start = time.perf_counter()
+
+    async def episodic_stage() -> List[dict]:
+        queries.extend(await _timed_stage(
+            "queries", generate_memory_queries(prompt, model_name), timings
+        ))
+        return await _timed_stage(
+            "episodic",
+            get_episodic_memories(manager, actor_id, session_id, queries),
+            timings,
+        )
+
+    stages = {
+        "stm": asyncio.create_task(_timed_stage(
+            "stm", asyncio.to_thread(get_stm_turns, manager, actor_id, session_id), timings
+        )),
+        "ltm": asyncio.create_task(_timed_stage(
+            "ltm", asyncio.to_thread(get_ltm_memories, manager, actor_id, prompt), timings
+        )),
+        "episodic": asyncio.create_task(episodic_stage()),
+    }
+
+    budget_ms = MEMORY_CONTEXT_CONFIG["latency_budget_ms"]
+    done, pending = await asyncio.wait(
+        stages.values(), timeout=budget_ms / 1000 if budget_ms > 0 else None
+    )
+    for task in pending:
+        task.cancel()
+
+    results = {}
+    dropped = []
+    failed = {}
+    for name, task in stages.items():
+        if task not in done:
+            results[name] = []
+            dropped.append(name)
+        elif task.exception() is not None:
+            results[name] = []
+            failed[name] = str(task.exception())
+        else:
+            results[name] = task.result()
+
+    ltm_memories, episodic_memories = results["ltm"], results["episodic"]
+    if RERANK_CONFIG["enabled"]:
+        rerank_start = time.perf_counter()
+        try:
+            ltm_memories, episodic_memories = rerank_retrieved(
+                prompt, queries or [prompt], ltm_memories, episodic_memories
+            )
+        except Exception as e:
+            logger.warning(f"Local memory reranking failed, using service scores: {e}")
+        timings["rerank"] = round((time.perf_counter() - rerank_start) * 1000, 1)
+
+    context, usage = assemble_memory_context(
+        build_memory_sections(
+            results["stm"], ltm_memories, episodic_memories, get_stm_summary(actor_id, session_id)
+        ),
+        MEMORY_CONTEXT_CONFIG["max_tokens"],
+        MEMORY_CONTEXT_CONFIG["dedupe_similarity"],
+    )
+
+    timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(f"Memory retrieval timings (ms): {timings}")
+    if dropped:
+        logger.warning(
+            f"Memory latency budget ({budget_ms} ms) exceeded for actor_id={actor_id}, "
+            f"session_id={session_id}; dropped sections: {dropped}"
+        )
+    if failed:
+        logger.warning(
+            f"Memory stages failed for actor_id={actor_id}, session_id={session_id}: {failed}"
+        )
+    logger.info(f"Memory context usage: {usage}")
+    logger.info(f"Memory metrics: {get_memory_metrics()}")
+
+    return {
+        "stm": context["stm"],
+        "ltm": context["ltm"],
+        "episodic": context["episodic"],
+        "dropped": dropped,
+        "failed": failed,
+        "usage": usage,
+        "timings": timings,
+    }
+
+
+async def warm_memory(manager: MemorySessionManager, actor_id: str, session_id: str) -> dict:
+    """Populate process caches for an actor/session ahead of its first prompt.
+
+    Seeds the STM buffer, resolves memory strategy IDs, schedules the actor's
+    episodic digest and refreshes the gateway token, all concurrently.
+
+    Returns:
+        dict with per-stage 'timings' (ms) and any 'errors'
+    """
+    timings = {}
+    start = time.perf_counter()
+    stages = {
+        "stm": asyncio.to_thread(get_stm_turns, manager, actor_id, session_id),
+        "strategies": asyncio.to_thread(_strategy_registry.get_strategies, manager, get_memory_id()),
+        "gateway_token": asyncio.to_thread(get_gateway_auth_token),
+    }
+    results = await asyncio.gather(
+        *(_timed_stage(name, coro, timings) for name, coro in stages.items()),
+        return_exceptions=True,
+    )
+    errors = {
+        name: str(result) for name, result in zip(stages, results) if isinstance(result, Exception)
+    }
+    # Non-blocking: registers the actor so the background refresher builds its digest
+    _episodic_digests.get(actor_id)
+
+    timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(f"Memory prewarm for actor_id={actor_id}, session_id={session_id}: {timings}")
+    if errors:
+        logger.warning(f"Memory prewarm errors: {errors}")
+    return {"timings": timings, "errors": errors}
+
+
 def get_subagents(model_name: str) -> dict:
     """Define sub-agents for parallel task execution.
 
@@ -469,17 +1088,62 @@ When executing code:
     }
 
 
+async def merge_tool_output(messages, output_queue: asyncio.Queue):
+    """Interleave agent SDK messages with streamed tool output in arrival order.
+
+    Yields ("message", msg) and ("output", event) pairs. Output already queued when a
+    message arrives is yielded first, so a tool's chunks always precede its result.
+    """
+    message_iter = messages.__aiter__()
+    next_message = asyncio.ensure_future(message_iter.__anext__())
+    next_output = asyncio.ensure_future(output_queue.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait(
+                {next_message, next_output}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if next_output in done:
+                yield "output", next_output.result()
+                next_output = asyncio.ensure_future(output_queue.get())
+            if next_message in done:
+                while not output_queue.empty():
+                    yield "output", output_queue.get_nowait()
+                try:
+                    msg = next_message.result()
+                except StopAsyncIteration:
+                    return
+                yield "message", msg
+                next_message = asyncio.ensure_future(message_iter.__anext__())
+    finally:
+        next_message.cancel()
+        next_output.cancel()
+
+
 @app.entrypoint
 async def main(payload):
     """
     Entrypoint to the agent. Takes the user prompt, uses code interpreter tools to execute the prompt.
     Yields intermediate responses for streaming.
+
+    A payload with "type": "warm" only prewarms the memory caches for its actor and
+    session (sent by the UI when a session is selected) and yields a single "warm" event.
     """
-    prompt = payload["prompt"]
     session_id = payload.get("session_id", "")
     actor_id = payload.get("actor_id", session_id or "default")
+
+    if payload.get("type") == "warm":
+        try:
+            warm = await warm_memory(get_memory_session_manager(), actor_id, session_id)
+        except Exception as e:
+            warm = {"timings": {}, "errors": {"memory": str(e)}}
+        yield {"type": "warm", "session_id": session_id, **warm}
+        return
+
+    prompt = payload["prompt"]
     agent_responses = []
     code_int_session_id = session_id
+    # Code Interpreter sessions are tracked and reused per runtime session
+    current_runtime_session.set(session_id)
 
     # Determine model format based on CLAUDE_CODE_USE_BEDROCK environment variable
     use_bedrock = os.environ.get("CLAUDE_CODE_USE_BEDROCK", "1") == "1"
@@ -498,14 +1162,13 @@ async def main(payload):
 
     try:
         memory_manager = get_memory_session_manager()
-        stm_context = get_stm_context(memory_manager, actor_id, session_id)
-        ltm_context = get_ltm_context(memory_manager, actor_id, prompt)
-
-        # Episodic memory retrieval with LLM-generated queries
-        memory_queries = await generate_memory_queries(prompt, model_name)
-        episodic_context = get_episodic_context(
-            memory_manager, actor_id, session_id, memory_queries
+        # STM, LTM and episodic (with LLM-generated queries) retrieved concurrently
+        memory = await retrieve_memory_context(
+            memory_manager, actor_id, session_id, prompt, model_name
         )
+        stm_context = memory["stm"]
+        ltm_context = memory["ltm"]
+        episodic_context = memory["episodic"]
 
         logger.info(
             f"Memory loaded - STM: {len(stm_context)} chars, "
@@ -573,16 +1236,18 @@ async def main(payload):
   CODE INTERPRETER TOOLS:
   - mcp__codeint__execute_code: Execute Python/code snippets.
   - mcp__codeint__execute_command: Execute bash/shell commands
+  - mcp__codeint__execute_batch: Run several code/command steps in order in one call. Prefer it over chained execute_code/execute_command calls for multi-step setup work
+    * Parameters: steps (list of {{"code", "language"}} or {{"command"}}), stop_on_error (default true), code_int_session_id
   - mcp__codeint_write_files: Write/save files. Make a list of path - name of the file, text - contents of the file
   - mcp__codeint_read_files: Read files. Make a list of path - name of the file
 
   S3 STORAGE TOOLS:
-  - mcp__codeint__upload_to_s3: Upload file from Code Interpreter to S3 bucket
-    * Parameters: file_path (local path), s3_key (destination key), code_int_session_id
-  - mcp__codeint__download_from_s3: Download file from S3 to Code Interpreter
-    * Parameters: s3_key (source key), local_path (destination), code_int_session_id
+  - mcp__codeint__upload_to_s3: Upload files from Code Interpreter to S3 bucket (content-addressed: unchanged files are not re-uploaded)
+    * Parameters: file_path (local path) and s3_key (destination key), or files (list of {{"local_path", "s3_key"}}) to upload several in parallel, code_int_session_id
+  - mcp__codeint__download_from_s3: Download files from S3 to Code Interpreter
+    * Parameters: s3_key (source key) and local_path (destination), or files (list of {{"s3_key", "local_path"}}), code_int_session_id
   - mcp__codeint__list_s3_files: List files in S3 bucket
-    * Parameters: prefix (filter by prefix), code_int_session_id
+    * Parameters: prefix (filter by prefix), max_results (default 1000), code_int_session_id
 
   BROWSER AUTOMATION TOOLS (AgentCore BrowserClient):
   - mcp__browser__search_web: Navigate to URLs and perform web searches
@@ -645,65 +1310,72 @@ async def main(payload):
   """,
     )
 
-    async with ClaudeSDKClient(options=options) as client:
-        await client.query(prompt)
-        async for msg in client.receive_messages():
-            if isinstance(msg, AssistantMessage):
-                for block in msg.content:
-                    if isinstance(block, ToolUseBlock):
-                        logger.info("*" * 80 + "\n")
-                        logger.info("TOOL USE: %s", block.name)
-                        logger.info(
-                            "Input Parameters:\n%s", json.dumps(block.input, indent=2)
-                        )
-                        logger.info("*" * 80 + "\n")
-                        # Yield tool use as a streaming chunk
-                        yield {
-                            "type": "tool_use",
-                            "tool_name": block.name,
-                            "tool_input": block.input,
-                            "session_id": code_int_session_id,
-                        }
-                    elif isinstance(block, TextBlock):
-                        logger.info("*" * 80 + "\n")
-                        logger.info("Agent response: %s", block.text)
-                        logger.info("*" * 80 + "\n")
-                        agent_responses.append(block.text)
-                        # Yield text response as a streaming chunk
-                        yield {
-                            "type": "text",
-                            "text": block.text,
-                            "session_id": code_int_session_id,
-                        }
-            elif isinstance(msg, UserMessage):
-                for block in msg.content:
-                    if isinstance(block, ToolResultBlock):
-                        if block.content and len(block.content) > 0:
-                            if isinstance(block.content[0], dict):
-                                text_content = block.content[0].get("text", "")
-                                logger.info("*" * 80 + "\n")
-                                logger.info("Tool Result: %s", text_content)
-                                logger.info("*" * 80 + "\n")
-                                # Parse tool result and extract session ID if available
-                                # This allows the agent to continue even if parsing fails
-                                try:
-                                    result_data = json.loads(text_content)
-                                    extracted_session_id = result_data.get(
-                                        "code_int_session_id", ""
-                                    )
+    # Code Interpreter stdout/stderr chunks from this runtime session's tool calls are
+    # streamed as "tool_output" events
+    output_queue = output_bus.subscribe(session_id)
+    try:
+        async with ClaudeSDKClient(options=options) as client:
+            await client.query(prompt)
+            async for kind, msg in merge_tool_output(client.receive_messages(), output_queue):
+                if kind == "output":
+                    yield {
+                        "type": "tool_output",
+                        "tool_name": msg["tool_name"],
+                        "stream": msg["stream"],
+                        "text": msg["text"],
+                        "seq": msg["seq"],
+                        "session_id": msg["code_int_session_id"] or code_int_session_id,
+                    }
+                elif isinstance(msg, AssistantMessage):
+                    for block in msg.content:
+                        if isinstance(block, ToolUseBlock):
+                            logger.info("*" * 80 + "\n")
+                            logger.info("TOOL USE: %s", block.name)
+                            logger.info(
+                                "Input Parameters:\n%s", json.dumps(block.input, indent=2)
+                            )
+                            logger.info("*" * 80 + "\n")
+                            # Yield tool use as a streaming chunk
+                            yield {
+                                "type": "tool_use",
+                                "tool_name": block.name,
+                                "tool_input": block.input,
+                                "session_id": code_int_session_id,
+                            }
+                        elif isinstance(block, TextBlock):
+                            logger.info("*" * 80 + "\n")
+                            logger.info("Agent response: %s", block.text)
+                            logger.info("*" * 80 + "\n")
+                            agent_responses.append(block.text)
+                            # Yield text response as a streaming chunk
+                            yield {
+                                "type": "text",
+                                "text": block.text,
+                                "session_id": code_int_session_id,
+                            }
+                elif isinstance(msg, UserMessage):
+                    for block in msg.content:
+                        if isinstance(block, ToolResultBlock):
+                            if block.content and len(block.content) > 0:
+                                if isinstance(block.content[0], dict):
+                                    text_content = block.content[0].get("text", "")
+                                    logger.info("*" * 80 + "\n")
+                                    logger.info("Tool Result: %s", text_content)
+                                    logger.info("*" * 80 + "\n")
+                                    # Code Interpreter results lead with the session ID, so
+                                    # it is read from the prefix without parsing the result
+                                    extracted_session_id = session_id_from_result_text(text_content)
                                     if extracted_session_id:
                                         code_int_session_id = extracted_session_id
-                                except json.JSONDecodeError as e:
-                                    logger.warning("Failed to parse tool result JSON: %s", e)
-                                    logger.warning("Raw content: %s", text_content[:200])
-                                    # Continue the loop - let Claude see the error and retry
-                        logger.info("*" * 80 + "\n")
-            elif isinstance(msg, ResultMessage):
-                logger.info("*" * 80 + "\n")
-                logger.info("ResultMessage received - conversation complete %s", msg)
-                break  # Exit loop when final result is received
-
-    # Store conversation turn in memory
+                            logger.info("*" * 80 + "\n")
+                elif isinstance(msg, ResultMessage):
+                    logger.info("*" * 80 + "\n")
+                    logger.info("ResultMessage received - conversation complete %s", msg)
+                    break  # Exit loop when final result is received
+    finally:
+        output_bus.unsubscribe(output_queue)
+
+    # Queue conversation turn for storage (persisted off the response path)
     if memory_manager and agent_responses:
         await store_turn(
             memory_manager, actor_id, session_id,
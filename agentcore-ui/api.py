@@ -37,6 +37,49 @@ class InvokeRequest(BaseModel):
     user_name: str = ""
 
 
+class WarmRequest(BaseModel):
+    agent_arn: str
+    session_id: str
+    user_name: str = ""
+
+
+@app.post("/warm")
+def warm(req: WarmRequest):
+    """Prewarm the runtime's memory caches for a session the user just selected."""
+    payload = json.dumps({
+            "type": "warm",
+            "session_id": req.session_id,
+            "actor_id": req.user_name,
+            "user_name": req.user_name
+        })
+
+    logger.info(f"[{datetime.now().isoformat()}] WARM REQUEST session={req.session_id} actor={req.user_name}")
+
+    try:
+        response = client.invoke_agent_runtime(
+            agentRuntimeArn=req.agent_arn,
+            runtimeSessionId=req.session_id,
+            payload=payload.encode(),
+            qualifier="DEFAULT",
+        )
+        result = {"type": "warm", "session_id": req.session_id}
+        for chunk in response.get("response").iter_lines():
+            chunk_str = chunk.decode("utf-8") if chunk else ""
+            if chunk_str.startswith("data:"):
+                chunk_str = chunk_str.split(":", 1)[1].strip()
+            if chunk_str:
+                try:
+                    result = json.loads(chunk_str)
+                except json.JSONDecodeError:
+                    logger.info(f"  warm raw: {chunk_str[:80]}")
+        logger.info(f"  warm result: {result.get('timings', {})}")
+        return result
+
+    except ClientError as e:
+        logger.error(f"  WARM ERROR: {str(e)}")
+        return {"type": "error", "error": str(e)}
+
+
 @app.post("/invoke")
 async def invoke(req: InvokeRequest):
     async def stream():
@@ -98,6 +141,8 @@ async def invoke(req: InvokeRequest):
                             logger.info(f"    [{event_count}] text: {text_preview}...")
                         elif event_type == "tool_use":
                             logger.info(f"    [{event_count}] tool_use: {data.get('tool_name', 'unknown')}")
+                        elif event_type == "tool_output":
+                            logger.info(f"    [{event_count}] tool_output ({data.get('stream', 'stdout')}): {data.get('text', '')[:50]}")
                         elif event_type == "final":
                             data["session_id"] = session_id
                             chunk_str = json.dumps(data)
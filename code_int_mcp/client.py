@@ -1,27 +1,58 @@
-import json
+import asyncio
+import atexit
+import contextvars
+import functools
+import os
 import time
 import boto3
 from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 import logging
+from typing import Any, Callable, Optional
+from .lifecycle import SessionLifecycleManager, current_runtime_session
 from .models import CodeIntExecutionResult
+from .pool import SessionPool
+from .s3_transfer import S3Transfer
+from .transfer import DEFAULT_CHUNK_SIZE, FileTransfer, TransferError
 
 # Logging setup
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+CODE_INTERPRETER_ID = "s3_code_interpreter-Eb7yoYoic6"
+SESSION_TIMEOUT_SECONDS = 900
+
 
 class CodeInterpreterClient:
     """Client for AgentCore Code Interpreter."""
 
-    def __init__(self, region_name: str = "eu-central-1"):
+    def __init__(self, region_name: str = "eu-central-1", pool_size: int = 0):
         self.ci_client = boto3.client("bedrock-agentcore", region_name=region_name)
+        # Pre-warmed sessions for first calls that arrive without a session ID (opt-in:
+        # one-off scripts working on an existing session should not start any)
+        self.pool = SessionPool(
+            self._create_sessionid,
+            self._stop_session,
+            size=pool_size,
+            session_timeout=SESSION_TIMEOUT_SECONDS,
+        )
+        self.pool.start()
+        # Every session handed out is tracked, reused per conversation and reaped when idle;
+        # the reaper starts with the first session this client hands out
+        self.lifecycle = SessionLifecycleManager(
+            self._stop_session,
+            idle_timeout=float(os.environ.get("CODE_INT_IDLE_TIMEOUT", "300")),
+            session_timeout=SESSION_TIMEOUT_SECONDS,
+        )
+        atexit.register(self.close)
+        self.s3 = S3Transfer(self)
 
     def _create_sessionid(self) -> str:
         try:
             session_response = self.ci_client.start_code_interpreter_session(
-                codeInterpreterIdentifier="s3_code_interpreter-Eb7yoYoic6",
+                codeInterpreterIdentifier=CODE_INTERPRETER_ID,
                 name="mcpInteractionSession",
-                sessionTimeoutSeconds=900,
+                sessionTimeoutSeconds=SESSION_TIMEOUT_SECONDS,
             )
         except ClientError as e:
             logging.error("***** Exception in create session %s", str(e))
@@ -30,26 +61,144 @@ class CodeInterpreterClient:
         code_int_session_id = session_response["sessionId"]
         return code_int_session_id
 
+    def _stop_session(self, code_int_session_id: str):
+        self.ci_client.stop_code_interpreter_session(
+            codeInterpreterIdentifier=CODE_INTERPRETER_ID,
+            sessionId=code_int_session_id,
+        )
+
+    def _acquire_sessionid(self) -> str:
+        """Session for a call without one: the conversation's live session if it has one,
+        else a pre-warmed session, creating one in line only if the pool is empty."""
+        owner = current_runtime_session.get()
+        code_int_session_id = self.lifecycle.session_for(owner)
+        if code_int_session_id:
+            logger.info("Reusing Code Interpreter session %s for runtime session %s", code_int_session_id, owner)
+            return code_int_session_id
+
+        start = time.perf_counter()
+        try:
+            leased = self.pool.lease()
+            if leased:
+                code_int_session_id, created_at = leased
+            else:
+                logger.info("Session pool empty, creating Code Interpreter session in line")
+                code_int_session_id, created_at = self._create_sessionid(), None
+        finally:
+            self.pool.record_wait(time.perf_counter() - start)
+        logger.info("Code Interpreter session pool: %s", self.pool.stats())
+        self.lifecycle.register(code_int_session_id, owner, created_at)
+        self.lifecycle.start()
+        return code_int_session_id
+
+    @staticmethod
+    def _session_gone(error: ClientError) -> bool:
+        """True if the service rejected a call because the session no longer exists."""
+        details = error.response.get("Error", {})
+        if details.get("Code") == "ResourceNotFoundException":
+            return True
+        message = details.get("Message", "").lower()
+        return "session" in message and any(
+            word in message for word in ("expired", "terminated", "not found", "does not exist")
+        )
+
+    def stats(self) -> dict:
+        """Code Interpreter session metrics."""
+        return {"pool": self.pool.stats(), "sessions": self.lifecycle.stats(), "s3_index": self.s3.index.stats()}
+
+    def close(self):
+        """Stop every session this client started, including unleased pool sessions."""
+        self.lifecycle.stop_all()
+        self.pool.drain()
+
+    @staticmethod
+    def _emit_output(result: dict, on_output: Callable, code_int_session_id: str):
+        """Forward the stdout/stderr carried by one stream event."""
+        structured = result.get("structuredContent") or {}
+        if "stdout" in structured or "stderr" in structured:
+            for stream in ("stdout", "stderr"):
+                if structured.get(stream):
+                    on_output(stream, structured[stream], code_int_session_id)
+            return
+        stream = "stderr" if result.get("isError") else "stdout"
+        for item in result.get("content", []):
+            if item.get("type") == "text" and item.get("text"):
+                on_output(stream, item["text"], code_int_session_id)
+
+    @staticmethod
+    def _merge_results(results: list) -> dict:
+        """Combine every stream event into one result instead of keeping only the last."""
+        if len(results) == 1:
+            return results[0]
+        merged = {"content": [], "isError": False}
+        structured = {}
+        for result in results:
+            merged["content"].extend(result.get("content", []))
+            merged["isError"] = merged["isError"] or bool(result.get("isError"))
+            for key, value in (result.get("structuredContent") or {}).items():
+                if key in ("stdout", "stderr"):
+                    structured[key] = structured.get(key, "") + (value or "")
+                else:
+                    structured[key] = value
+        if structured:
+            merged["structuredContent"] = structured
+        return merged
+
+    @staticmethod
+    def _compact_result(result: dict) -> Any:
+        """Keep only what the model needs from a result: structuredContent when the
+        operation provides it (its stdout already repeats the text content), otherwise
+        the content items. Empty fields are dropped."""
+        if result.get("structuredContent"):
+            compact = {k: v for k, v in result["structuredContent"].items() if v not in ("", None)}
+        else:
+            compact = {"content": result.get("content", [])}
+        if result.get("isError"):
+            compact["isError"] = True
+        return compact
+
     def _invoke_code_interpreter(
-        self, operation: str, args: dict = None, code_int_session_id: str = ""
+        self,
+        operation: str,
+        args: dict = None,
+        code_int_session_id: str = "",
+        on_output: Optional[Callable[[str, str, str], None]] = None,
+        compact: bool = True,
     ) -> CodeIntExecutionResult:
+        """Invoke `operation` and drain its event stream.
+
+        If `on_output` is given it is called as on_output(stream, text, session_id)
+        with each stdout/stderr chunk as its event arrives. With `compact=False` the
+        merged service result is returned as is (used by file transfers).
+        """
         start_time = time.time()
+        if code_int_session_id and self.lifecycle.was_stopped(code_int_session_id):
+            logger.info("Code Interpreter session %s was stopped, starting a new one", code_int_session_id)
+            code_int_session_id = ""
         try:
             if not code_int_session_id:
-                code_int_session_id = self._create_sessionid()
+                code_int_session_id = self._acquire_sessionid()
+            self.lifecycle.begin(code_int_session_id)
 
             # Execute code
             response = self.ci_client.invoke_code_interpreter(
-                codeInterpreterIdentifier="s3_code_interpreter-Eb7yoYoic6",
+                codeInterpreterIdentifier=CODE_INTERPRETER_ID,
                 sessionId=code_int_session_id,
                 name=operation,
                 arguments=args if args else {},
             )
-            output = ""
+            results = []
             for event in response["stream"]:
-                output = json.dumps(event["result"], indent=2)
+                if "result" not in event:
+                    continue
+                results.append(event["result"])
+                if on_output:
+                    self._emit_output(event["result"], on_output, code_int_session_id)
+            output = self._merge_results(results) if results else None
+            if output is not None and compact:
+                output = self._compact_result(output)
 
-            execution_time = time.time() - start_time
+            execution_time = round(time.time() - start_time, 3)
 
             return CodeIntExecutionResult(
                 output=output,
@@ -59,27 +208,111 @@ class CodeInterpreterClient:
             )
         except ClientError as e:
             logging.error("***** Exception in code interpreter invocation %s", str(e))
-            execution_time = time.time() - start_time
+            if code_int_session_id and self._session_gone(e):
+                # Let the next call for this conversation start a fresh session
+                self.lifecycle.discard(code_int_session_id)
+            execution_time = round(time.time() - start_time, 3)
             return CodeIntExecutionResult(
-                output="",
                 code_int_session_id=code_int_session_id,
                 error=str(e),
                 execution_time=execution_time,
                 success=False,
             )
+        finally:
+            if code_int_session_id:
+                self.lifecycle.end(code_int_session_id)
 
     def execute_code(
-        self, code: str, language: str = "python", code_int_session_id: str = ""
+        self,
+        code: str,
+        language: str = "python",
+        code_int_session_id: str = "",
+        on_output: Optional[Callable[[str, str, str], None]] = None,
     ) -> CodeIntExecutionResult:
         args = {"code": code, "language": language, "clearContext": False}
-        return self._invoke_code_interpreter("executeCode", args, code_int_session_id)
+        return self._invoke_code_interpreter("executeCode", args, code_int_session_id, on_output)
 
     def execute_command(
-        self, command: str, code_int_session_id: str = ""
+        self,
+        command: str,
+        code_int_session_id: str = "",
+        on_output: Optional[Callable[[str, str, str], None]] = None,
     ) -> CodeIntExecutionResult:
         args = {"command": command}
         return self._invoke_code_interpreter(
-            "executeCommand", args, code_int_session_id
+            "executeCommand", args, code_int_session_id, on_output
+        )
+
+    @staticmethod
+    def _invalid_steps(steps: Any) -> list:
+        """[{"step": index, "error": ...}] for every malformed batch step."""
+        if not isinstance(steps, list):
+            return [{"step": None, "error": f"steps must be a list, got {type(steps).__name__}"}]
+        invalid = []
+        for index, step in enumerate(steps):
+            if not isinstance(step, dict):
+                invalid.append({"step": index, "error": f"expected an object, got {type(step).__name__}"})
+            elif "code" not in step and "command" not in step:
+                invalid.append({"step": index, "error": "missing 'code' or 'command'"})
+        return invalid
+
+    @staticmethod
+    def _step_failed(result: CodeIntExecutionResult) -> bool:
+        output = result.output if isinstance(result.output, dict) else {}
+        return not result.success or output.get("isError") or output.get("exitCode", 0) != 0
+
+    def execute_batch(
+        self,
+        steps: list,
+        stop_on_error: bool = True,
+        code_int_session_id: str = "",
+        on_output: Optional[Callable[[str, str, str], None]] = None,
+    ) -> CodeIntExecutionResult:
+        """Run ordered code/command steps in one session.
+
+        Each step is {"code": ..., "language": ...} or {"command": ...}. With
+        `stop_on_error`, steps after the first failure are skipped. `output` holds one
+        compact entry per step that ran plus the count of skipped steps. A malformed
+        batch runs nothing and returns an error listing the invalid steps.
+        """
+        start_time = time.time()
+        invalid = self._invalid_steps(steps)
+        if invalid:
+            return CodeIntExecutionResult(
+                code_int_session_id=code_int_session_id,
+                success=False,
+                execution_time=round(time.time() - start_time, 3),
+                output={"invalid_steps": invalid},
+                error="Invalid batch: each step must be an object with 'code' or 'command'",
+            )
+        if not code_int_session_id:
+            code_int_session_id = self._acquire_sessionid()
+
+        step_results = []
+        failed = False
+        for index, step in enumerate(steps):
+            if failed and stop_on_error:
+                break
+            if "command" in step:
+                result = self.execute_command(step["command"], code_int_session_id, on_output)
+            else:
+                result = self.execute_code(
+                    step.get("code", ""), step.get("language", "python"), code_int_session_id, on_output
+                )
+            # A reaped session is replaced inside the call; keep using the new one
+            code_int_session_id = result.code_int_session_id
+            step_failed = self._step_failed(result)
+            failed = failed or step_failed
+            entry = {"step": index, "success": not step_failed, "output": result.output}
+            if result.error:
+                entry["error"] = result.error
+            step_results.append(entry)
+
+        return CodeIntExecutionResult(
+            code_int_session_id=code_int_session_id,
+            success=not failed,
+            execution_time=round(time.time() - start_time, 3),
+            output={"steps": step_results, "skipped": len(steps) - len(step_results)},
         )
 
     def write_files(
@@ -93,3 +326,108 @@ class CodeInterpreterClient:
     ) -> CodeIntExecutionResult:
         args = {"paths": paths}
         return self._invoke_code_interpreter("readFiles", args, code_int_session_id)
+
+    def _transfer(self, method: str, src: str, dst: str, code_int_session_id: str, chunk_size: int) -> CodeIntExecutionResult:
+        start_time = time.time()
+        try:
+            return getattr(FileTransfer(self, chunk_size), method)(src, dst, code_int_session_id)
+        except (TransferError, OSError) as e:
+            logger.error("File transfer %s %s -> %s failed: %s", method, src, dst, e)
+            return CodeIntExecutionResult(
+                code_int_session_id=code_int_session_id,
+                error=str(e),
+                execution_time=round(time.time() - start_time, 3),
+                success=False,
+            )
+
+    def download_file(
+        self, remote_path: str, local_path: str, code_int_session_id: str = "", chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> CodeIntExecutionResult:
+        """Copy a session file to the local host in verified chunks (resumable)."""
+        return self._transfer("download", remote_path, local_path, code_int_session_id, chunk_size)
+
+    def upload_file(
+        self, local_path: str, remote_path: str, code_int_session_id: str = "", chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> CodeIntExecutionResult:
+        """Copy a local file into the session in verified chunks (resumable)."""
+        return self._transfer("upload", local_path, remote_path, code_int_session_id, chunk_size)
+
+    def upload_to_s3(self, files: list, code_int_session_id: str = "") -> CodeIntExecutionResult:
+        """Upload session files [{"local_path", "s3_key"}, ...] to the artifacts bucket."""
+        return self.s3.upload(files, code_int_session_id)
+
+    def download_from_s3(self, files: list, code_int_session_id: str = "") -> CodeIntExecutionResult:
+        """Download [{"s3_key", "local_path"}, ...] from the artifacts bucket into the session."""
+        return self.s3.download(files, code_int_session_id)
+
+    def list_s3_files(self, prefix: str = "", max_results: int = 1000, code_int_session_id: str = "") -> CodeIntExecutionResult:
+        """List objects under `prefix` in the artifacts bucket (all pages)."""
+        return self.s3.list(prefix, max_results, code_int_session_id)
+
+
+class AsyncCodeInterpreterClient:
+    """Asyncio front end for CodeInterpreterClient.
+
+    Each call runs the blocking boto3 invocation (and stream drain) on a bounded
+    thread pool, so concurrent MCP tool calls overlap instead of blocking the
+    event loop.
+    """
+
+    def __init__(self, client: CodeInterpreterClient, max_workers: int = None):
+        self.client = client
+        if max_workers is None:
+            max_workers = int(os.environ.get("CODE_INT_MAX_WORKERS", "8"))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="code-int")
+
+    async def _run(self, fn, *args):
+        # Copy the caller's context so the worker sees current_runtime_session
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, functools.partial(ctx.run, fn, *args))
+
+    async def execute_code(
+        self,
+        code: str,
+        language: str = "python",
+        code_int_session_id: str = "",
+        on_output: Optional[Callable[[str, str, str], None]] = None,
+    ) -> CodeIntExecutionResult:
+        return await self._run(self.client.execute_code, code, language, code_int_session_id, on_output)
+
+    async def execute_command(
+        self,
+        command: str,
+        code_int_session_id: str = "",
+        on_output: Optional[Callable[[str, str, str], None]] = None,
+    ) -> CodeIntExecutionResult:
+        return await self._run(self.client.execute_command, command, code_int_session_id, on_output)
+
+    async def execute_batch(
+        self,
+        steps: list,
+        stop_on_error: bool = True,
+        code_int_session_id: str = "",
+        on_output: Optional[Callable[[str, str, str], None]] = None,
+    ) -> CodeIntExecutionResult:
+        return await self._run(self.client.execute_batch, steps, stop_on_error, code_int_session_id, on_output)
+
+    async def write_files(
+        self, files: list, code_int_session_id: str = ""
+    ) -> CodeIntExecutionResult:
+        return await self._run(self.client.write_files, files, code_int_session_id)
+
+    async def read_files(
+        self, paths: list, code_int_session_id: str = ""
+    ) -> CodeIntExecutionResult:
+        return await self._run(self.client.read_files, paths, code_int_session_id)
+
+    async def upload_to_s3(self, files: list, code_int_session_id: str = "") -> CodeIntExecutionResult:
+        return await self._run(self.client.upload_to_s3, files, code_int_session_id)
+
+    async def download_from_s3(self, files: list, code_int_session_id: str = "") -> CodeIntExecutionResult:
+        return await self._run(self.client.download_from_s3, files, code_int_session_id)
+
+    async def list_s3_files(
+        self, prefix: str = "", max_results: int = 1000, code_int_session_id: str = ""
+    ) -> CodeIntExecutionResult:
+        return await self._run(self.client.list_s3_files, prefix, max_results, code_int_session_id)
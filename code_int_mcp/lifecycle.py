@@ -0,0 +1,210 @@
+"""Code Interpreter session lifecycle: ownership, reuse and idle reaping."""
+
+import contextvars
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Agent runtime session the current tool call belongs to (set by the entrypoint)
+current_runtime_session: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "current_runtime_session", default=""
+)
+
+
+class _TrackedSession:
+    __slots__ = ("session_id", "owner", "created_at", "last_used", "in_flight")
+
+    def __init__(self, session_id: str, owner: str, created_at: float, now: float):
+        self.session_id = session_id
+        self.owner = owner
+        self.created_at = created_at
+        self.last_used = now
+        self.in_flight = 0
+
+
+class SessionLifecycleManager:
+    """Tracks every Code Interpreter session handed out by this process.
+
+    Each session is mapped to the agent runtime session (`owner`) it was created for,
+    so later calls in the same conversation that arrive without a session ID reuse it.
+    A daemon thread stops sessions idle for `idle_timeout` seconds with
+    stop_code_interpreter_session instead of leaving them to the service timeout,
+    and forgets sessions that have reached `session_timeout` or that the service
+    reported gone (`discard()`). Sessions with calls in flight are never reaped.
+    """
+
+    def __init__(
+        self,
+        stop_session: Callable[[str], None],
+        idle_timeout: float = 300,
+        session_timeout: float = 900,
+        expiry_margin: float = 60,
+        reap_interval: float = 30,
+    ):
+        self.stop_session = stop_session
+        self.idle_timeout = idle_timeout
+        self.session_timeout = session_timeout
+        self.expiry_margin = expiry_margin
+        self.reap_interval = reap_interval
+        self._sessions: Dict[str, _TrackedSession] = {}
+        self._by_owner: Dict[str, str] = {}
+        self._stopped: Dict[str, float] = {}  # session_id -> stopped_at, to spot stale IDs
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self.registered = 0
+        self.reused = 0
+        self.reaped = 0
+        self.expired = 0
+        self.lost = 0
+        self.stop_failures = 0
+
+    def start(self):
+        """Start the background reaper thread (idempotent)."""
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._run, name="code-int-reaper", daemon=True)
+            self._worker.start()
+
+    def _usable(self, tracked: _TrackedSession, now: float) -> bool:
+        return now - tracked.created_at < self.session_timeout - self.expiry_margin
+
+    def register(self, session_id: str, owner: str = "", created_at: Optional[float] = None):
+        """Start tracking a session this process created or leased for `owner`.
+
+        `created_at` is the session's start time (time.monotonic()) if it was started
+        earlier, e.g. a pre-warmed pool session; it defaults to now.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[session_id] = _TrackedSession(
+                session_id, owner, created_at if created_at is not None else now, now
+            )
+            if owner:
+                self._by_owner[owner] = session_id
+            self.registered += 1
+
+    def session_for(self, owner: str) -> Optional[str]:
+        """The live session already serving `owner`'s conversation, if any."""
+        if not owner:
+            return None
+        with self._lock:
+            session_id = self._by_owner.get(owner)
+            tracked = self._sessions.get(session_id) if session_id else None
+            if tracked and self._usable(tracked, time.monotonic()):
+                self.reused += 1
+                return session_id
+        return None
+
+    def was_stopped(self, session_id: str) -> bool:
+        """True if this manager stopped `session_id` (a caller is holding a stale ID)."""
+        with self._lock:
+            return session_id in self._stopped
+
+    def begin(self, session_id: str):
+        """Mark a call in flight; untracked (caller-supplied) sessions are ignored."""
+        with self._lock:
+            tracked = self._sessions.get(session_id)
+            if tracked:
+                tracked.in_flight += 1
+                tracked.last_used = time.monotonic()
+
+    def end(self, session_id: str):
+        with self._lock:
+            tracked = self._sessions.get(session_id)
+            if tracked:
+                tracked.in_flight = max(tracked.in_flight - 1, 0)
+                tracked.last_used = time.monotonic()
+
+    def discard(self, session_id: str):
+        """Forget a session the service reported missing or expired.
+
+        It is recorded as stopped, so calls still holding its ID get a fresh session.
+        """
+        with self._lock:
+            tracked = self._sessions.get(session_id)
+            if tracked:
+                self._forget(tracked, stopped=True)
+                self.lost += 1
+
+    def _forget(self, tracked: _TrackedSession, stopped: bool):
+        self._sessions.pop(tracked.session_id, None)
+        if tracked.owner and self._by_owner.get(tracked.owner) == tracked.session_id:
+            del self._by_owner[tracked.owner]
+        if stopped:
+            self._stopped[tracked.session_id] = time.monotonic()
+
+    def _stop(self, session_id: str) -> bool:
+        try:
+            self.stop_session(session_id)
+            return True
+        except Exception as e:
+            self.stop_failures += 1
+            logger.info(f"Failed to stop Code Interpreter session {session_id}: {e}")
+            return False
+
+    def reap(self) -> int:
+        """Stop idle sessions and forget expired ones. Returns the number stopped."""
+        now = time.monotonic()
+        to_stop = []
+        with self._lock:
+            for tracked in list(self._sessions.values()):
+                if tracked.in_flight:
+                    continue
+                if now - tracked.created_at >= self.session_timeout:
+                    # Already timed out on the service side
+                    self._forget(tracked, stopped=True)
+                    self.expired += 1
+                elif now - tracked.last_used >= self.idle_timeout:
+                    self._forget(tracked, stopped=True)
+                    to_stop.append(tracked.session_id)
+            # Stale-ID markers only matter while a caller might still send them
+            for session_id, stopped_at in list(self._stopped.items()):
+                if now - stopped_at >= self.session_timeout:
+                    del self._stopped[session_id]
+
+        stopped = 0
+        for session_id in to_stop:
+            if self._stop(session_id):
+                stopped += 1
+        with self._lock:
+            self.reaped += stopped
+        if to_stop:
+            logger.info(f"Reaped {stopped}/{len(to_stop)} idle Code Interpreter sessions")
+        return stopped
+
+    def stop_all(self):
+        """Stop every tracked session (process shutdown)."""
+        with self._lock:
+            tracked = list(self._sessions.values())
+            for item in tracked:
+                self._forget(item, stopped=True)
+        for item in tracked:
+            self._stop(item.session_id)
+
+    def _run(self):
+        while True:
+            time.sleep(self.reap_interval)
+            try:
+                self.reap()
+            except Exception as e:
+                logger.warning(f"Code Interpreter session reaper failed: {e}")
+
+    def stats(self) -> dict:
+        """Live session counts and lifecycle counters."""
+        with self._lock:
+            return {
+                "live": len(self._sessions),
+                "in_use": sum(1 for t in self._sessions.values() if t.in_flight),
+                "idle": sum(1 for t in self._sessions.values() if not t.in_flight),
+                "owners": len(self._by_owner),
+                "registered": self.registered,
+                "reused": self.reused,
+                "reaped": self.reaped,
+                "expired": self.expired,
+                "lost": self.lost,
+                "stop_failures": self.stop_failures,
+            }
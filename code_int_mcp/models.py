@@ -1,14 +1,33 @@
 """Data models for Code Interpreter."""
 
+import re
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Any, Optional
+
+# Tool results are serialized with code_int_session_id as the first key
+_SESSION_ID_PREFIX = re.compile(r'^\{"code_int_session_id":"([^"]*)"')
 
 
 class CodeIntExecutionResult(BaseModel):
-    """Result model for code execution."""
+    """Result model for code execution.
+
+    `output` holds the structured Code Interpreter result (not a JSON string), so a
+    tool result is encoded exactly once. `code_int_session_id` is declared first so
+    it leads the serialized JSON.
+    """
 
-    output: str
     code_int_session_id: str
-    execution_time: float = Field(..., ge=0, description="Execution time in seconds")
     success: bool
+    execution_time: float = Field(..., ge=0, description="Execution time in seconds")
+    output: Any = None
     error: Optional[str] = None
+
+    def to_json(self) -> str:
+        """Compact JSON for MCP tool results (no indentation, empty fields omitted)."""
+        return self.model_dump_json(exclude_none=True)
+
+
+def session_id_from_result_text(text: str) -> Optional[str]:
+    """Read code_int_session_id from the head of a serialized result without parsing it."""
+    match = _SESSION_ID_PREFIX.match(text)
+    return match.group(1) if match else None
@@ -0,0 +1,149 @@
+"""Pre-warmed Code Interpreter session pool."""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SessionPool:
+    """Keeps `size` Code Interpreter sessions started in the background.
+
+    New conversations lease a ready session instead of paying for
+    start_code_interpreter_session in line. A daemon thread refills the pool after
+    every lease and recycles idle sessions that are within `recycle_margin` seconds
+    of the session timeout, so a leased session always has useful lifetime left.
+    """
+
+    def __init__(
+        self,
+        create_session: Callable[[], str],
+        stop_session: Callable[[str], None],
+        size: int = 2,
+        session_timeout: float = 900,
+        recycle_margin: float = 180,
+        retry_delay: float = 5.0,
+    ):
+        self.create_session = create_session
+        self.stop_session = stop_session
+        self.size = size
+        self.session_timeout = session_timeout
+        self.recycle_margin = recycle_margin
+        self.retry_delay = retry_delay
+        self._ready: "deque[tuple[str, float]]" = deque()  # (session_id, created_at)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._started_at = time.monotonic()
+        self.leases = 0
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.recycled = 0
+        self.failures = 0
+        self._lease_wait_total = 0.0
+
+    def start(self):
+        """Start the background refill thread (idempotent)."""
+        with self._lock:
+            if self.size <= 0 or (self._worker is not None and self._worker.is_alive()):
+                return
+            self._worker = threading.Thread(target=self._run, name="code-int-pool", daemon=True)
+            self._worker.start()
+
+    def _expires_soon(self, created_at: float, now: float) -> bool:
+        return now - created_at >= self.session_timeout - self.recycle_margin
+
+    def lease(self) -> Optional[Tuple[str, float]]:
+        """Take a ready session as (session_id, created_at monotonic time), or None if
+        the pool is empty (caller creates one in line)."""
+        now = time.monotonic()
+        leased = None
+        with self._lock:
+            while self._ready:
+                candidate = self._ready.popleft()
+                if not self._expires_soon(candidate[1], now):
+                    leased = candidate
+                    break
+                self._recycle_later(candidate[0])
+            self.leases += 1
+            if leased:
+                self.hits += 1
+            else:
+                self.misses += 1
+        self._wakeup.set()
+        return leased
+
+    def record_wait(self, seconds: float):
+        """Record how long a caller waited for a session, in-line creation on a miss included."""
+        with self._lock:
+            self._lease_wait_total += seconds
+
+    def _recycle_later(self, session_id: str):
+        """Stop an expiring session off the caller's path."""
+        self.recycled += 1
+        threading.Thread(target=self._stop_quietly, args=(session_id,), daemon=True).start()
+
+    def _stop_quietly(self, session_id: str):
+        try:
+            self.stop_session(session_id)
+        except Exception as e:
+            logger.info(f"Failed to stop recycled session {session_id}: {e}")
+
+    def _run(self):
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                expired = [s for s in self._ready if self._expires_soon(s[1], now)]
+                for item in expired:
+                    self._ready.remove(item)
+                    self._recycle_later(item[0])
+                missing = self.size - len(self._ready)
+
+            for _ in range(max(missing, 0)):
+                try:
+                    session_id = self.create_session()
+                except Exception as e:
+                    self.failures += 1
+                    logger.warning(f"Session pool refill failed: {e}")
+                    time.sleep(self.retry_delay)
+                    break
+                with self._lock:
+                    self._ready.append((session_id, time.monotonic()))
+                    self.refills += 1
+
+            # Wake on the next lease, or in time to recycle the oldest ready session
+            with self._lock:
+                if len(self._ready) < self.size:
+                    continue
+                oldest = min((created for _, created in self._ready), default=now)
+            wait = max(1.0, self.session_timeout - self.recycle_margin - (time.monotonic() - oldest))
+            self._wakeup.wait(timeout=wait)
+            self._wakeup.clear()
+
+    def drain(self):
+        """Stop every ready session (e.g. on shutdown)."""
+        with self._lock:
+            ready, self._ready = list(self._ready), deque()
+        for session_id, _ in ready:
+            self._stop_quietly(session_id)
+
+    def stats(self) -> dict:
+        """Pool size, lease wait and refill rate metrics."""
+        with self._lock:
+            uptime_min = max((time.monotonic() - self._started_at) / 60, 1e-9)
+            return {
+                "target_size": self.size,
+                "ready": len(self._ready),
+                "leases": self.leases,
+                "hits": self.hits,
+                "misses": self.misses,
+                "avg_lease_wait_ms": round(self._lease_wait_total / self.leases * 1000, 3) if self.leases else 0.0,
+                "refills": self.refills,
+                "refills_per_min": round(self.refills / uptime_min, 2),
+                "recycled": self.recycled,
+                "failures": self.failures,
+            }
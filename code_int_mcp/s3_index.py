@@ -0,0 +1,116 @@
+"""Per-process index of S3 prefix listings for the artifacts bucket."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# key -> (size, etag, last_modified, sha256); size and sha256 are the blob's for
+# content-addressed manifests, sha256 is "" for plain objects
+ObjectMap = Dict[str, Tuple[int, str, str, str]]
+
+
+class _Listing:
+    __slots__ = ("objects", "listed_at", "dirty")
+
+    def __init__(self, objects: ObjectMap):
+        self.objects = objects
+        self.listed_at = time.monotonic()
+        self.dirty = False
+
+
+class S3ListingIndex:
+    """Complete object listings per prefix, served from memory while fresh.
+
+    A listing answers its own prefix and any longer prefix under it. Entries go
+    stale after `ttl` seconds or when `invalidate()` reports a key written under
+    them (our upload tools do this); a stale entry is refreshed with a delta
+    (objects whose ETag changed, plus removed keys) instead of a full re-listing.
+    At most `max_prefixes` listings are kept, least recently used evicted first.
+    """
+
+    def __init__(self, ttl: float = 60, max_prefixes: int = 256):
+        self.ttl = ttl
+        self.max_prefixes = max_prefixes
+        self._listings: "OrderedDict[str, _Listing]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.delta_refreshes = 0
+        self.full_refreshes = 0
+        self.invalidations = 0
+
+    def lookup(self, prefix: str) -> Optional[Tuple[str, ObjectMap, bool]]:
+        """(indexed prefix, its objects, fresh) for the closest listing covering `prefix`."""
+        now = time.monotonic()
+        with self._lock:
+            covering = [p for p in self._listings if prefix.startswith(p)]
+            if not covering:
+                return None
+            base = max(covering, key=len)
+            listing = self._listings[base]
+            self._listings.move_to_end(base)
+            fresh = not listing.dirty and now - listing.listed_at < self.ttl
+            if fresh:
+                self.hits += 1
+            return base, listing.objects, fresh
+
+    def store(self, prefix: str, objects: ObjectMap):
+        """Record a complete listing of `prefix` (replaces listings under it)."""
+        with self._lock:
+            for p in [p for p in self._listings if p.startswith(prefix)]:
+                del self._listings[p]
+            self._listings[prefix] = _Listing(objects)
+            while len(self._listings) > self.max_prefixes:
+                self._listings.popitem(last=False)
+            self.full_refreshes += 1
+
+    def apply_delta(self, prefix: str, changed: ObjectMap, removed: Iterable[str]) -> ObjectMap:
+        """Fold a delta refresh into the listing for `prefix` and mark it fresh."""
+        with self._lock:
+            listing = self._listings.get(prefix)
+            objects = dict(listing.objects) if listing else {}
+            objects.update(changed)
+            for key in removed:
+                objects.pop(key, None)
+            self._listings[prefix] = _Listing(objects)
+            self.delta_refreshes += 1
+            return objects
+
+    def invalidate(self, keys: Iterable[str]):
+        """Mark every listing that covers one of `keys` as stale."""
+        keys = list(keys)
+        with self._lock:
+            for prefix, listing in self._listings.items():
+                if any(key.startswith(prefix) for key in keys):
+                    listing.dirty = True
+                    self.invalidations += 1
+
+    @staticmethod
+    def view(prefix: str, objects: ObjectMap, max_results: int) -> dict:
+        """Listing result for `prefix` built from an indexed object map."""
+        keys = sorted(k for k in objects if k.startswith(prefix))
+        rows: List[dict] = []
+        for k in keys[:max_results]:
+            size, etag, last_modified, sha256 = objects[k]
+            row = {"key": k, "size": size, "etag": etag, "last_modified": last_modified}
+            if sha256:
+                row["sha256"] = sha256
+            rows.append(row)
+        return {
+            "prefix": prefix,
+            "count": len(keys),
+            "total_bytes": sum(objects[k][0] for k in keys),
+            "objects": rows,
+            "truncated": len(keys) > len(rows),
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "prefixes": len(self._listings),
+                "objects": sum(len(l.objects) for l in self._listings.values()),
+                "hits": self.hits,
+                "delta_refreshes": self.delta_refreshes,
+                "full_refreshes": self.full_refreshes,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,350 @@
+"""S3 transfers between a Code Interpreter session and the artifacts bucket.
+
+Files live in the session, so transfers run there: one fixed script per call handles
+a whole batch, moving files in parallel (`max_parallel_files`) with boto3 managed
+multipart transfers (TransferConfig), and listings follow every list_objects_v2
+page. Arguments are passed as JSON (see run_session_script), and every call returns
+a structured result with byte counts, durations and throughput.
+
+Uploads are content-addressed by default (S3_CONTENT_ADDRESSED=1): the session hashes
+each file, uploads it to CAS_BLOB_PREFIX/<sha[:2]>/<sha> only if that blob does not
+exist yet, and writes a small manifest at the requested key. Downloads resolve
+manifests to their blob and verify its SHA-256. Listings report the blob's size
+and SHA-256 for manifest keys (from the manifest's object metadata) and hide the
+blob area unless the requested prefix points into it.
+
+Note that the requested keys then hold JSON manifests, not the file contents:
+anything reading them outside these tools (the console, `aws s3 cp`, presigned
+URLs) gets the manifest and must follow its "blob" key.
+"""
+
+import os
+import time
+from typing import TYPE_CHECKING, Any, List, Tuple
+
+from .models import CodeIntExecutionResult
+from .s3_index import S3ListingIndex
+from .transfer import TransferError, run_session_script
+
+if TYPE_CHECKING:
+    from .client import CodeInterpreterClient
+
+S3_BUCKET = os.environ.get("S3_ARTIFACT_BUCKET", "agentcore-artifacts-597088042181")
+MB = 1024 * 1024
+
+# Content-addressed uploads store each distinct file once under CAS_BLOB_PREFIX; the
+# requested key holds a small JSON manifest pointing at the blob
+CAS_BLOB_PREFIX = os.environ.get("S3_CAS_PREFIX", "_cas/blobs/")
+MANIFEST_CONTENT_TYPE = "application/vnd.artifact-manifest+json"
+# Listed objects up to this size are checked for being manifests (HEAD request)
+MANIFEST_MAX_BYTES = 2048
+
+
+def shows_blobs(prefix: str, cas_prefix: str = CAS_BLOB_PREFIX) -> bool:
+    """True if a listing of `prefix` includes content-addressed blobs (it points into
+    the blob area); other listings hide them."""
+    return bool(prefix) and (prefix.startswith(cas_prefix) or cas_prefix.startswith(prefix))
+
+# Runs in the session with _params: {"op", "bucket", transfer settings, "files" | "prefix"}
+_S3_SCRIPT = """
+import hashlib, os, time
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(8388608), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _exists(s3, bucket, key):
+    try:
+        s3.head_object(Bucket=bucket, Key=key)
+        return True
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+
+def _upload_content_addressed(s3, p, item, config, entry):
+    sha = _sha256(item["local_path"])
+    size = os.path.getsize(item["local_path"])
+    blob_key = p["cas_prefix"] + sha[:2] + "/" + sha
+    deduplicated = _exists(s3, p["bucket"], blob_key)
+    if not deduplicated:
+        s3.upload_file(item["local_path"], p["bucket"], blob_key, Config=config)
+    manifest = {"blob": blob_key, "sha256": sha, "size": size, "name": os.path.basename(item["local_path"])}
+    s3.put_object(Bucket=p["bucket"], Key=item["s3_key"], Body=json.dumps(manifest).encode(),
+                  ContentType=p["manifest_type"],
+                  Metadata={"cas-sha256": sha, "cas-blob": blob_key, "cas-size": str(size)})
+    entry.update(sha256=sha, blob_key=blob_key, deduplicated=deduplicated)
+    return 0 if deduplicated else size
+
+
+def _download(s3, p, item, config, entry):
+    # Keys written by content-addressed uploads hold a manifest; fetch the blob it names
+    head = s3.head_object(Bucket=p["bucket"], Key=item["s3_key"])
+    source, expected = item["s3_key"], None
+    if head.get("ContentType") == p["manifest_type"]:
+        source, expected = head["Metadata"]["cas-blob"], head["Metadata"]["cas-sha256"]
+    target_dir = os.path.dirname(item["local_path"])
+    if target_dir:
+        os.makedirs(target_dir, exist_ok=True)
+    s3.download_file(p["bucket"], source, item["local_path"], Config=config)
+    if expected:
+        if _sha256(item["local_path"]) != expected:
+            raise ValueError("checksum mismatch for blob " + source)
+        entry.update(sha256=expected, blob_key=source)
+    return os.path.getsize(item["local_path"])
+
+
+def _manifest_info(s3, p, key):
+    # (blob size, sha256) for a manifest key, None for a plain object
+    head = s3.head_object(Bucket=p["bucket"], Key=key)
+    if head.get("ContentType") != p["manifest_type"]:
+        return None
+    meta = head.get("Metadata", {})
+    if "cas-size" in meta:
+        return int(meta["cas-size"]), meta["cas-sha256"]
+    # Manifests written before cas-size was recorded
+    manifest = json.loads(s3.get_object(Bucket=p["bucket"], Key=key)["Body"].read())
+    return manifest["size"], manifest["sha256"]
+
+
+def _list(s3, p):
+    # Rows are [key, size, etag, last_modified, sha256]; manifest keys report their
+    # blob's size and hash (sha256 is "" for plain objects). With "known" ({key: etag})
+    # only new or changed objects and removed keys are returned; otherwise all objects
+    # while the prefix holds at most index_limit keys, else the first max_results.
+    known = p.get("known")
+    hidden = None if p["shows_blobs"] else p["cas_prefix"]
+    rows, seen, count, total = [], set(), 0, 0
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=p["bucket"], Prefix=p["prefix"]):
+        for obj in page.get("Contents", []):
+            if hidden and obj["Key"].startswith(hidden):
+                continue
+            count += 1
+            total += obj["Size"]
+            etag = obj["ETag"].strip('"')
+            if known is not None:
+                seen.add(obj["Key"])
+                if known.get(obj["Key"]) == etag:
+                    continue
+            if known is not None or len(rows) <= p["index_limit"]:
+                rows.append([obj["Key"], obj["Size"], etag, obj["LastModified"].isoformat(), ""])
+    complete = known is not None or count <= p["index_limit"]
+    if not complete:
+        rows = rows[:p["max_results"]]
+
+    candidates = [row for row in rows
+                  if row[1] <= p["manifest_max_bytes"] and not row[0].startswith(p["cas_prefix"])]
+    with ThreadPoolExecutor(max_workers=max(1, p["max_concurrency"])) as pool:
+        infos = list(pool.map(lambda row: _manifest_info(s3, p, row[0]), candidates))
+    for row, info in zip(candidates, infos):
+        if info:
+            total += info[0] - row[1]
+            row[1], row[4] = info
+
+    result = {"count": count, "total_bytes": total, "complete": complete, "rows": rows}
+    if known is not None:
+        result["removed"] = [key for key in known if key not in seen]
+    return result
+
+
+def _transfer(s3, p):
+    config = TransferConfig(
+        multipart_threshold=p["multipart_threshold"],
+        multipart_chunksize=p["multipart_chunksize"],
+        max_concurrency=p["max_concurrency"],
+    )
+
+    def one(item):
+        start = time.perf_counter()
+        entry = {"s3_key": item["s3_key"], "local_path": item["local_path"]}
+        try:
+            if p["op"] == "download":
+                transferred = _download(s3, p, item, config, entry)
+            elif p["content_addressed"]:
+                transferred = _upload_content_addressed(s3, p, item, config, entry)
+            else:
+                s3.upload_file(item["local_path"], p["bucket"], item["s3_key"], Config=config)
+                transferred = os.path.getsize(item["local_path"])
+            seconds = time.perf_counter() - start
+            entry.update(bytes=os.path.getsize(item["local_path"]), bytes_transferred=transferred,
+                         seconds=round(seconds, 3),
+                         mb_per_s=round(transferred / 1048576 / seconds, 2) if seconds else None)
+        except Exception as e:
+            entry["error"] = str(e)
+        return entry
+
+    start = time.perf_counter()
+    workers = max(1, min(p["max_parallel_files"], len(p["files"])))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        files = list(pool.map(one, p["files"]))
+    seconds = time.perf_counter() - start
+    total = sum(f.get("bytes", 0) for f in files)
+    transferred = sum(f.get("bytes_transferred", 0) for f in files)
+    return {"bucket": p["bucket"], "files": files, "total_bytes": total, "bytes_transferred": transferred,
+            "seconds": round(seconds, 3),
+            "mb_per_s": round(transferred / 1048576 / seconds, 2) if seconds else None,
+            "deduplicated": sum(1 for f in files if f.get("deduplicated")),
+            "failed": sum(1 for f in files if "error" in f)}
+
+
+try:
+    _s3 = boto3.client("s3")
+    _result = _list(_s3, _params) if _params["op"] == "list" else _transfer(_s3, _params)
+except Exception as e:
+    _result = {"error": str(e)}
+print(json.dumps(_result))
+"""
+
+
+class S3Transfer:
+    """Batch S3 upload/download/list for files in a Code Interpreter session.
+
+    Multipart and parallelism settings default to the S3_MULTIPART_THRESHOLD_MB,
+    S3_MULTIPART_CHUNKSIZE_MB, S3_MAX_CONCURRENCY (threads per file) and
+    S3_MAX_PARALLEL_FILES environment variables; S3_CONTENT_ADDRESSED=0 turns off
+    content-addressed uploads.
+    """
+
+    def __init__(self, client: "CodeInterpreterClient", bucket: str = S3_BUCKET):
+        self.client = client
+        self.bucket = bucket
+        self.settings = {
+            "multipart_threshold": int(os.environ.get("S3_MULTIPART_THRESHOLD_MB", "8")) * MB,
+            "multipart_chunksize": int(os.environ.get("S3_MULTIPART_CHUNKSIZE_MB", "8")) * MB,
+            "max_concurrency": int(os.environ.get("S3_MAX_CONCURRENCY", "10")),
+            "max_parallel_files": int(os.environ.get("S3_MAX_PARALLEL_FILES", "4")),
+            "content_addressed": os.environ.get("S3_CONTENT_ADDRESSED", "1") == "1",
+            "cas_prefix": CAS_BLOB_PREFIX,
+            "manifest_type": MANIFEST_CONTENT_TYPE,
+            "manifest_max_bytes": MANIFEST_MAX_BYTES,
+        }
+        # Listings of up to index_limit keys are cached per prefix for S3_LIST_CACHE_TTL seconds
+        self.index = S3ListingIndex(ttl=float(os.environ.get("S3_LIST_CACHE_TTL", "60")))
+        self.index_limit = int(os.environ.get("S3_LIST_INDEX_MAX_KEYS", "20000"))
+
+    def _run(self, params: dict, code_int_session_id: str) -> CodeIntExecutionResult:
+        start_time = time.time()
+        code_int_session_id = code_int_session_id or self.client._acquire_sessionid()
+        try:
+            output = run_session_script(
+                self.client, _S3_SCRIPT, {"bucket": self.bucket, **self.settings, **params}, code_int_session_id
+            )
+        except TransferError as e:
+            return CodeIntExecutionResult(
+                code_int_session_id=code_int_session_id,
+                success=False,
+                execution_time=round(time.time() - start_time, 3),
+                error=str(e),
+            )
+        return CodeIntExecutionResult(
+            code_int_session_id=code_int_session_id,
+            success=not output.get("failed"),
+            execution_time=round(time.time() - start_time, 3),
+            output=output,
+        )
+
+    @staticmethod
+    def _split_items(files: Any) -> Tuple[List[dict], List[dict]]:
+        """(well-formed {"local_path", "s3_key"} items, error entries for the rest)."""
+        if not isinstance(files, list):
+            return [], [{"error": f"files must be a list, got {type(files).__name__}"}]
+        valid, rejected = [], []
+        for index, item in enumerate(files):
+            fields = item if isinstance(item, dict) else {}
+            missing = [k for k in ("local_path", "s3_key") if not isinstance(fields.get(k), str) or not fields[k]]
+            if missing:
+                rejected.append({"item": index, "error": f"missing {' and '.join(missing)}"})
+            else:
+                valid.append({"local_path": fields["local_path"], "s3_key": fields["s3_key"]})
+        return valid, rejected
+
+    def _transfer(self, op: str, files: Any, code_int_session_id: str) -> CodeIntExecutionResult:
+        """Run an upload/download batch; malformed items are reported per item, not raised."""
+        valid, rejected = self._split_items(files)
+        if not valid:
+            return CodeIntExecutionResult(
+                code_int_session_id=code_int_session_id,
+                success=False,
+                execution_time=0.0,
+                output={"files": rejected, "failed": len(rejected)},
+                error="No valid files to transfer",
+            )
+        result = self._run({"op": op, "files": valid}, code_int_session_id)
+        if rejected:
+            result.success = False
+            if result.output:
+                result.output["files"] = result.output["files"] + rejected
+                result.output["failed"] += len(rejected)
+        return result
+
+    def upload(self, files: List[dict], code_int_session_id: str = "") -> CodeIntExecutionResult:
+        """Upload [{"local_path", "s3_key"}, ...] from the session."""
+        result = self._transfer("upload", files, code_int_session_id)
+        # Listings covering these keys (and any new content-addressed blobs) are stale
+        # even if part of the batch failed
+        keys = [f["s3_key"] for f in self._split_items(files)[0]]
+        keys += [f["blob_key"] for f in (result.output or {}).get("files", []) if f.get("blob_key")]
+        self.index.invalidate(keys)
+        return result
+
+    def download(self, files: List[dict], code_int_session_id: str = "") -> CodeIntExecutionResult:
+        """Download [{"s3_key", "local_path"}, ...] into the session."""
+        return self._transfer("download", files, code_int_session_id)
+
+    def list(self, prefix: str = "", max_results: int = 1000, code_int_session_id: str = "") -> CodeIntExecutionResult:
+        """List every object under `prefix` (all pages); at most `max_results` are returned.
+
+        Served from the listing index while a covering listing is fresh; a stale one is
+        refreshed with a delta, and an unindexed prefix is listed in full.
+        """
+        start_time = time.time()
+        cached = self.index.lookup(prefix)
+        if cached and shows_blobs(prefix) and not shows_blobs(cached[0]):
+            # Listings outside the blob area do not include blobs
+            cached = None
+        if cached and cached[2]:
+            base, objects, _ = cached
+            return CodeIntExecutionResult(
+                code_int_session_id=code_int_session_id,
+                success=True,
+                execution_time=round(time.time() - start_time, 6),
+                output={"bucket": self.bucket, **self.index.view(prefix, objects, max_results), "source": "index"},
+            )
+
+        params = {"op": "list", "max_results": max_results, "index_limit": self.index_limit}
+        if cached and len(cached[1]) <= self.index_limit:
+            base, objects, _ = cached
+            params.update(prefix=base, known={key: meta[1] for key, meta in objects.items()})
+        else:
+            base, params["prefix"] = prefix, prefix
+        params["shows_blobs"] = shows_blobs(base)
+        result = self._run(params, code_int_session_id)
+        if not result.success:
+            return result
+
+        listing = result.output
+        rows = {row[0]: tuple(row[1:]) for row in listing["rows"]}
+        if not listing["complete"]:
+            # Too large to index: answer from this listing only
+            objects, source = rows, "full"
+        elif "known" in params:
+            objects, source = self.index.apply_delta(base, rows, listing["removed"]), "delta"
+        else:
+            self.index.store(base, rows)
+            objects, source = rows, "full"
+
+        view = self.index.view(prefix, objects, max_results)
+        if not listing["complete"]:
+            view.update(count=listing["count"], total_bytes=listing["total_bytes"], truncated=True)
+        result.output = {"bucket": self.bucket, **view, "source": source}
+        return result
@@ -1,15 +1,20 @@
 """In process MCP server for Code Interpreter."""
 
-from .client import CodeInterpreterClient
+from .client import AsyncCodeInterpreterClient, CodeInterpreterClient
+from .streaming import output_bus
 from claude_agent_sdk import tool, create_sdk_mcp_server
 from typing import Any
 import json
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
-# Initialize the client
-client = CodeInterpreterClient()
+# Initialize the client (blocking calls run on the async client's thread pool) with
+# CODE_INT_POOL_SIZE pre-warmed sessions for new conversations
+client = AsyncCodeInterpreterClient(
+    CodeInterpreterClient(pool_size=int(os.environ.get("CODE_INT_POOL_SIZE", "2")))
+)
 
 
 @tool(
@@ -18,14 +23,13 @@ client = CodeInterpreterClient()
     {"code": str, "language": str, "code_int_session_id": str},
 )
 async def execute_code(args: dict[str, Any]) -> dict[str, Any]:
-    result = client.execute_code(
+    result = await client.execute_code(
         args.get("code"),
         args.get("language", "python"),
         args.get("code_int_session_id", ""),
+        on_output=output_bus.output_callback("execute_code"),
     )
-    response_text = result.model_dump_json(indent=2)
-
-    return {"content": [{"type": "text", "text": response_text}]}
+    return {"content": [{"type": "text", "text": result.to_json()}]}
 
 
 @tool(
@@ -34,12 +38,33 @@ async def execute_code(args: dict[str, Any]) -> dict[str, Any]:
     {"command": str, "code_int_session_id": str},
 )
 async def execute_command(args: dict[str, Any]) -> dict[str, Any]:
-    result = client.execute_command(
-        args.get("command"), args.get("code_int_session_id", "")
+    result = await client.execute_command(
+        args.get("command"),
+        args.get("code_int_session_id", ""),
+        on_output=output_bus.output_callback("execute_command"),
     )
-    response_text = result.model_dump_json(indent=2)
+    return {"content": [{"type": "text", "text": result.to_json()}]}
 
-    return {"content": [{"type": "text", "text": response_text}]}
+
+@tool(
+    "execute_batch",
+    "Run several code and command steps in order in one Code Interpreter session with a single tool call. "
+    "Each step is {\"code\": \"...\", \"language\": \"python\"} or {\"command\": \"...\"}. "
+    "With stop_on_error (default true) steps after the first failure are skipped. "
+    "IMPORTANT: For the first call, pass an empty string for code_int_session_id to create a new session.",
+    {"steps": list, "stop_on_error": bool, "code_int_session_id": str},
+)
+async def execute_batch(args: dict[str, Any]) -> dict[str, Any]:
+    steps = args["steps"]
+    if isinstance(steps, str):
+        steps = json.loads(steps)
+    result = await client.execute_batch(
+        steps,
+        args.get("stop_on_error", True),
+        args.get("code_int_session_id", ""),
+        on_output=output_bus.output_callback("execute_batch"),
+    )
+    return {"content": [{"type": "text", "text": result.to_json()}]}
 
 
 @tool(
@@ -52,10 +77,8 @@ async def write_files(args: dict[str, Any]) -> dict[str, Any]:
     if isinstance(files_to_create, str):
         files_to_create = json.loads(files_to_create)
 
-    result = client.write_files(files_to_create, args.get("code_int_session_id", ""))
-    response_text = result.model_dump_json(indent=2)
-
-    return {"content": [{"type": "text", "text": response_text}]}
+    result = await client.write_files(files_to_create, args.get("code_int_session_id", ""))
+    return {"content": [{"type": "text", "text": result.to_json()}]}
 
 
 @tool(
@@ -67,75 +90,94 @@ async def read_files(args: dict[str, Any]) -> dict[str, Any]:
     paths = args["paths"]
     if isinstance(paths, str):
         paths = json.loads(paths)
-    result = client.read_files(paths, args.get("code_int_session_id", ""))
-    response_text = result.model_dump_json(indent=2)
+    result = await client.read_files(paths, args.get("code_int_session_id", ""))
+    return {"content": [{"type": "text", "text": result.to_json()}]}
 
-    return {"content": [{"type": "text", "text": response_text}]}
+
+def _transfer_items(args: dict, src: str, dst: str) -> list:
+    """Batch `files` list, or a single src/dst pair, as [{src: ..., dst: ...}]."""
+    files = args.get("files") or []
+    if isinstance(files, str):
+        files = json.loads(files)
+    if args.get(src) and args.get(dst):
+        files = files + [{src: args[src], dst: args[dst]}]
+    return files
 
 
 @tool(
     "upload_to_s3",
-    "Upload a file from Code Interpreter to S3 bucket. IMPORTANT: For the first call, pass an empty string for code_int_session_id to create a new session.",
-    {"file_path": str, "s3_key": str, "code_int_session_id": str},
+    "Upload files from Code Interpreter to the S3 artifacts bucket in parallel (large files use multipart). "
+    "Uploads are content-addressed: a file whose content is already stored is not transferred again (deduplicated: true), "
+    "and s3_key holds a small JSON manifest pointing at the stored blob; use download_from_s3 to get the file back. "
+    "Pass file_path and s3_key for one file, or files=[{\"local_path\": ..., \"s3_key\": ...}] for a batch. "
+    "Returns bytes and throughput per file. IMPORTANT: For the first call, pass an empty string for code_int_session_id to create a new session.",
+    {
+        "type": "object",
+        "properties": {
+            "file_path": {"type": "string"},
+            "s3_key": {"type": "string"},
+            "files": {"type": "array", "items": {"type": "object"}},
+            "code_int_session_id": {"type": "string"},
+        },
+        "required": ["code_int_session_id"],
+    },
 )
 async def upload_to_s3(args: dict[str, Any]) -> dict[str, Any]:
-    file_path = args.get("file_path")
-    s3_key = args.get("s3_key")
-    code = f'''
-import boto3
-s3 = boto3.client('s3')
-bucket = 'agentcore-artifacts-597088042181'
-s3.upload_file('{file_path}', bucket, '{s3_key}')
-print(f"Uploaded {file_path} to s3://{{bucket}}/{s3_key}")
-'''
-    result = client.execute_code(code, "python", args.get("code_int_session_id", ""))
-    return {"content": [{"type": "text", "text": result.model_dump_json(indent=2)}]}
+    # Malformed items are passed through and reported per item by the transfer
+    files = [
+        {"local_path": f.get("local_path") or f.get("file_path"), "s3_key": f.get("s3_key")}
+        if isinstance(f, dict) else f
+        for f in _transfer_items(args, "file_path", "s3_key")
+    ]
+    result = await client.upload_to_s3(files, args.get("code_int_session_id", ""))
+    return {"content": [{"type": "text", "text": result.to_json()}]}
 
 
 @tool(
     "download_from_s3",
-    "Download a file from S3 to Code Interpreter. IMPORTANT: For the first call, pass an empty string for code_int_session_id to create a new session.",
-    {"s3_key": str, "local_path": str, "code_int_session_id": str},
+    "Download files from the S3 artifacts bucket to Code Interpreter in parallel (large files use multipart). "
+    "Pass s3_key and local_path for one file, or files=[{\"s3_key\": ..., \"local_path\": ...}] for a batch. "
+    "Returns bytes and throughput per file. IMPORTANT: For the first call, pass an empty string for code_int_session_id to create a new session.",
+    {
+        "type": "object",
+        "properties": {
+            "s3_key": {"type": "string"},
+            "local_path": {"type": "string"},
+            "files": {"type": "array", "items": {"type": "object"}},
+            "code_int_session_id": {"type": "string"},
+        },
+        "required": ["code_int_session_id"],
+    },
 )
 async def download_from_s3(args: dict[str, Any]) -> dict[str, Any]:
-    s3_key = args.get("s3_key")
-    local_path = args.get("local_path")
-    code = f'''
-import boto3
-s3 = boto3.client('s3')
-bucket = 'agentcore-artifacts-597088042181'
-s3.download_file(bucket, '{s3_key}', '{local_path}')
-print(f"Downloaded s3://{{bucket}}/{s3_key} to {local_path}")
-'''
-    result = client.execute_code(code, "python", args.get("code_int_session_id", ""))
-    return {"content": [{"type": "text", "text": result.model_dump_json(indent=2)}]}
+    files = _transfer_items(args, "s3_key", "local_path")
+    result = await client.download_from_s3(files, args.get("code_int_session_id", ""))
+    return {"content": [{"type": "text", "text": result.to_json()}]}
 
 
 @tool(
     "list_s3_files",
-    "List files in the S3 bucket. IMPORTANT: For the first call, pass an empty string for code_int_session_id to create a new session.",
-    {"prefix": str, "code_int_session_id": str},
+    "List files in the S3 artifacts bucket under a prefix (all pages). Returns key, size, ETag and last-modified per object, "
+    "up to max_results objects (default 1000), plus the total count and bytes. Content-addressed uploads are listed with the size and sha256 of the stored file. IMPORTANT: For the first call, pass an empty string for code_int_session_id to create a new session.",
+    {
+        "type": "object",
+        "properties": {
+            "prefix": {"type": "string"},
+            "max_results": {"type": "integer"},
+            "code_int_session_id": {"type": "string"},
+        },
+        "required": ["code_int_session_id"],
+    },
 )
 async def list_s3_files(args: dict[str, Any]) -> dict[str, Any]:
-    prefix = args.get("prefix", "")
-    code = f'''
-import boto3
-s3 = boto3.client('s3')
-bucket = 'agentcore-artifacts-597088042181'
-response = s3.list_objects_v2(Bucket=bucket, Prefix='{prefix}')
-files = response.get('Contents', [])
-if files:
-    for obj in files:
-        print(f"{{obj['Key']}} ({{obj['Size']}} bytes)")
-else:
-    print("No files found with prefix '{prefix}'")
-'''
-    result = client.execute_code(code, "python", args.get("code_int_session_id", ""))
-    return {"content": [{"type": "text", "text": result.model_dump_json(indent=2)}]}
+    result = await client.list_s3_files(
+        args.get("prefix", ""), int(args.get("max_results", 1000)), args.get("code_int_session_id", "")
+    )
+    return {"content": [{"type": "text", "text": result.to_json()}]}
 
 
 code_int_mcp_server = create_sdk_mcp_server(
     name="codeinterpretertools",
     version="1.0.0",
-    tools=[execute_code, execute_command, write_files, read_files, upload_to_s3, download_from_s3, list_s3_files],
+    tools=[execute_code, execute_command, execute_batch, write_files, read_files, upload_to_s3, download_from_s3, list_s3_files],
 )
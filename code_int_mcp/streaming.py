@@ -0,0 +1,73 @@
+"""In-process bus for streaming Code Interpreter output to the agent entrypoint."""
+
+import asyncio
+import itertools
+import threading
+from typing import Optional
+
+from .lifecycle import current_runtime_session
+
+
+class OutputBus:
+    """Fans out stdout/stderr chunks from running tool calls to subscribed event loops.
+
+    `publish()` is thread-safe (the client drains invocation streams on worker threads)
+    and hands each event to every matching subscriber's unbounded asyncio.Queue via
+    `call_soon_threadsafe`, so chunks arrive in order and none are dropped. Events are
+    tagged with the agent runtime session of the tool call that produced them, and a
+    subscriber for one runtime session only receives that session's events. Events
+    published while nobody is subscribed are discarded.
+    """
+
+    def __init__(self):
+        self._subscribers = []  # (loop, queue, runtime_session or None for all)
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+
+    def subscribe(self, runtime_session: Optional[str] = None) -> asyncio.Queue:
+        """Return a queue receiving events published from now on, only those of
+        `runtime_session` if given."""
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.append((asyncio.get_running_loop(), queue, runtime_session))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s[1] is not queue]
+
+    def publish(self, event: dict):
+        with self._lock:
+            subscribers = [
+                (loop, queue) for loop, queue, runtime_session in self._subscribers
+                if runtime_session is None or runtime_session == event.get("runtime_session")
+            ]
+            event = {**event, "seq": next(self._seq)}
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # Subscriber's loop already closed
+                self.unsubscribe(queue)
+
+    def output_callback(self, tool_name: str, code_int_session_id: str = ""):
+        """Build an `on_output(stream, text, code_int_session_id)` callback for one tool call.
+
+        Must be called in the tool call's context: it captures `current_runtime_session`
+        there, since the callback itself runs on a worker thread.
+        """
+        runtime_session = current_runtime_session.get()
+
+        def on_output(stream: str, text: str, session_id: str = ""):
+            self.publish({
+                "type": "tool_output",
+                "runtime_session": runtime_session,
+                "tool_name": tool_name,
+                "stream": stream,
+                "text": text,
+                "code_int_session_id": session_id or code_int_session_id,
+            })
+        return on_output
+
+
+output_bus = OutputBus()
@@ -0,0 +1,286 @@
+"""Chunked, checksummed file transfer between the local host and a Code Interpreter session.
+
+Files move in fixed-size binary chunks over writeFiles/readFiles resource blobs
+instead of base64 on stdout, so artifacts never pass through logs or model context.
+Only small JSON manifests are exchanged through executeCode.
+
+Downloads stage the remote file as chunk files under STAGE_ROOT, read each chunk's
+blob, verify its SHA-256 and write it in place into `<local_path>.part`. Progress is
+recorded in `<local_path>.part.json`, so an interrupted download resumes from the
+missing chunks. Uploads write chunks into a staging directory in the session; chunks
+already staged with a matching hash are skipped on retry, then the file is
+reassembled and verified in the session.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import TYPE_CHECKING
+
+from .models import CodeIntExecutionResult
+
+if TYPE_CHECKING:
+    from .client import CodeInterpreterClient
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+STAGE_ROOT = "/tmp/.code_int_transfer"
+
+# Runs in the session: hash the file, split it into chunk files (once per content hash)
+_STAGE_DOWNLOAD = """
+import hashlib, json, os, shutil
+p = _params
+try:
+    hashes, total = [], hashlib.sha256()
+    with open(p["path"], "rb") as f:
+        while True:
+            data = f.read(p["chunk_size"])
+            if not data:
+                break
+            total.update(data)
+            hashes.append(hashlib.sha256(data).hexdigest())
+    stage = os.path.join(p["stage_root"], "down-" + total.hexdigest() + "-" + str(p["chunk_size"]))
+    # The marker is written after the last chunk, so an interrupted staging is rebuilt
+    marker = os.path.join(stage, "complete")
+    if not os.path.exists(marker):
+        shutil.rmtree(stage, ignore_errors=True)
+        os.makedirs(stage)
+        with open(p["path"], "rb") as f:
+            for i in range(len(hashes)):
+                with open(os.path.join(stage, "%06d.bin" % i), "wb") as out:
+                    out.write(f.read(p["chunk_size"]))
+        with open(marker, "w") as out:
+            out.write(total.hexdigest())
+    print(json.dumps({"size": os.path.getsize(p["path"]), "sha256": total.hexdigest(), "chunks": hashes, "stage": stage}))
+except Exception as e:
+    print(json.dumps({"error": str(e)}))
+"""
+
+# Runs in the session: report which upload chunks are already staged intact
+_PROBE_UPLOAD = """
+import hashlib, json, os
+p = _params
+present = []
+if os.path.isdir(p["stage"]):
+    for i, expected in enumerate(p["chunks"]):
+        chunk = os.path.join(p["stage"], "%06d.bin" % i)
+        if os.path.exists(chunk):
+            with open(chunk, "rb") as f:
+                if hashlib.sha256(f.read()).hexdigest() == expected:
+                    present.append(i)
+print(json.dumps({"present": present}))
+"""
+
+# Runs in the session: reassemble staged chunks into the target and verify it
+_FINISH_UPLOAD = """
+import hashlib, json, os, shutil
+p = _params
+try:
+    total = hashlib.sha256()
+    target_dir = os.path.dirname(os.path.abspath(p["path"]))
+    os.makedirs(target_dir, exist_ok=True)
+    tmp = p["path"] + ".part"
+    with open(tmp, "wb") as out:
+        for i in range(p["chunk_count"]):
+            with open(os.path.join(p["stage"], "%06d.bin" % i), "rb") as f:
+                data = f.read()
+            total.update(data)
+            out.write(data)
+    if total.hexdigest() != p["sha256"]:
+        os.remove(tmp)
+        print(json.dumps({"error": "checksum mismatch after reassembly"}))
+    else:
+        os.replace(tmp, p["path"])
+        shutil.rmtree(p["stage"], ignore_errors=True)
+        print(json.dumps({"size": os.path.getsize(p["path"]), "sha256": total.hexdigest()}))
+except Exception as e:
+    print(json.dumps({"error": str(e)}))
+"""
+
+_CLEANUP = """
+import shutil
+shutil.rmtree(_params["stage"], ignore_errors=True)
+"""
+
+
+class TransferError(Exception):
+    """A chunked transfer step failed (the partial state is kept for resume)."""
+
+
+def run_session_script(client: "CodeInterpreterClient", script: str, params: dict, code_int_session_id: str) -> dict:
+    """Run `script` in the session with `params` bound to `_params` and return the JSON
+    object it prints on its last stdout line.
+
+    Parameters travel as a JSON string literal, never interpolated into the source.
+    Raises TransferError if the call fails or the script reports {"error": ...}.
+    """
+    code = f"import json\n_params = json.loads({json.dumps(params)!r})\n{script}"
+    result = client.execute_code(code, "python", code_int_session_id)
+    if not result.success:
+        raise TransferError(result.error)
+    output = result.output or {}
+    stdout = output.get("stdout", "").strip()
+    try:
+        data = json.loads(stdout.splitlines()[-1]) if stdout else {}
+    except json.JSONDecodeError:
+        raise TransferError(f"Unexpected transfer script output: {stdout[:200]}")
+    if not data and output.get("stderr"):
+        raise TransferError(output["stderr"][-500:])
+    if "error" in data:
+        raise TransferError(data["error"])
+    return data
+
+
+class FileTransfer:
+    """Chunked upload/download over an existing CodeInterpreterClient."""
+
+    def __init__(self, client: "CodeInterpreterClient", chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.client = client
+        self.chunk_size = chunk_size
+
+    def _run_script(self, script: str, params: dict, code_int_session_id: str) -> dict:
+        return run_session_script(self.client, script, params, code_int_session_id)
+
+    def _read_blob(self, path: str, code_int_session_id: str) -> bytes:
+        result = self.client._invoke_code_interpreter(
+            "readFiles", {"paths": [path]}, code_int_session_id, compact=False
+        )
+        if not result.success or not result.output:
+            raise TransferError(result.error or f"No content returned for {path}")
+        for item in result.output.get("content", []):
+            resource = item.get("resource") if item.get("type") == "resource" else None
+            if not resource:
+                continue
+            if "blob" in resource:
+                blob = resource["blob"]
+                return base64.b64decode(blob) if isinstance(blob, str) else blob
+            if "text" in resource:
+                return resource["text"].encode("utf-8")
+        raise TransferError(f"readFiles returned no resource for {path}")
+
+    # --- Download ------------------------------------------------------------
+
+    @staticmethod
+    def _load_progress(state_path: str, manifest: dict) -> set:
+        try:
+            with open(state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return set()
+        if state.get("sha256") != manifest["sha256"] or state.get("chunks") != len(manifest["chunks"]):
+            return set()
+        return set(state.get("done", []))
+
+    @staticmethod
+    def _discard(path: str):
+        if os.path.exists(path):
+            os.remove(path)
+
+    def download(self, remote_path: str, local_path: str, code_int_session_id: str = "") -> CodeIntExecutionResult:
+        """Copy `remote_path` from the session to `local_path`, resuming a previous attempt."""
+        start_time = time.time()
+        code_int_session_id = code_int_session_id or self.client._acquire_sessionid()
+        part_path, state_path = local_path + ".part", local_path + ".part.json"
+        manifest = self._run_script(
+            _STAGE_DOWNLOAD,
+            {"path": remote_path, "chunk_size": self.chunk_size, "stage_root": STAGE_ROOT},
+            code_int_session_id,
+        )
+        done = self._load_progress(state_path, manifest)
+        if not done or not os.path.exists(part_path):
+            done = set()
+            with open(part_path, "wb") as f:
+                f.truncate(manifest["size"])
+        resumed = len(done)
+
+        with open(part_path, "r+b") as f:
+            for index, expected in enumerate(manifest["chunks"]):
+                if index in done:
+                    continue
+                data = self._read_blob(f"{manifest['stage']}/{index:06d}.bin", code_int_session_id)
+                if hashlib.sha256(data).hexdigest() != expected:
+                    raise TransferError(f"Checksum mismatch on chunk {index} of {remote_path}")
+                f.seek(index * self.chunk_size)
+                f.write(data)
+                done.add(index)
+                with open(state_path, "w") as state:
+                    json.dump({"sha256": manifest["sha256"], "chunks": len(manifest["chunks"]), "done": sorted(done)}, state)
+
+        total = hashlib.sha256()
+        with open(part_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                total.update(block)
+        if total.hexdigest() != manifest["sha256"]:
+            self._discard(state_path)
+            raise TransferError(f"Checksum mismatch on {remote_path}; partial download discarded")
+        os.replace(part_path, local_path)
+        self._discard(state_path)
+        self._run_script_quietly(_CLEANUP, {"stage": manifest["stage"]}, code_int_session_id)
+
+        return CodeIntExecutionResult(
+            code_int_session_id=code_int_session_id,
+            success=True,
+            execution_time=round(time.time() - start_time, 3),
+            output={
+                "path": local_path,
+                "bytes": manifest["size"],
+                "sha256": manifest["sha256"],
+                "chunks": len(manifest["chunks"]),
+                "resumed_chunks": resumed,
+            },
+        )
+
+    # --- Upload --------------------------------------------------------------
+
+    def upload(self, local_path: str, remote_path: str, code_int_session_id: str = "") -> CodeIntExecutionResult:
+        """Copy `local_path` into the session at `remote_path`, skipping chunks already staged."""
+        start_time = time.time()
+        code_int_session_id = code_int_session_id or self.client._acquire_sessionid()
+        hashes, total = [], hashlib.sha256()
+        with open(local_path, "rb") as f:
+            for data in iter(lambda: f.read(self.chunk_size), b""):
+                total.update(data)
+                hashes.append(hashlib.sha256(data).hexdigest())
+        stage = f"{STAGE_ROOT}/up-{total.hexdigest()}-{self.chunk_size}"
+
+        present = set(self._run_script(_PROBE_UPLOAD, {"stage": stage, "chunks": hashes}, code_int_session_id)["present"])
+        with open(local_path, "rb") as f:
+            for index in range(len(hashes)):
+                if index in present:
+                    continue
+                f.seek(index * self.chunk_size)
+                result = self.client._invoke_code_interpreter(
+                    "writeFiles",
+                    {"content": [{"path": f"{stage}/{index:06d}.bin", "blob": f.read(self.chunk_size)}]},
+                    code_int_session_id,
+                )
+                if not result.success or (result.output or {}).get("isError"):
+                    raise TransferError(result.error or f"writeFiles failed for chunk {index} of {local_path}")
+
+        final = self._run_script(
+            _FINISH_UPLOAD,
+            {"stage": stage, "path": remote_path, "chunk_count": len(hashes), "sha256": total.hexdigest()},
+            code_int_session_id,
+        )
+        return CodeIntExecutionResult(
+            code_int_session_id=code_int_session_id,
+            success=True,
+            execution_time=round(time.time() - start_time, 3),
+            output={
+                "path": remote_path,
+                "bytes": final["size"],
+                "sha256": final["sha256"],
+                "chunks": len(hashes),
+                "resumed_chunks": len(present),
+            },
+        )
+
+    def _run_script_quietly(self, template: str, params: dict, code_int_session_id: str):
+        try:
+            self._run_script(template, params, code_int_session_id)
+        except TransferError as e:
+            logger.info(f"Transfer cleanup failed: {e}")
@@ -1,68 +1,21 @@
 """
-Quick script to get the cats presentation as base64 using the agent.
-Run this, then save the base64 output to a file and decode it.
+Quick script to fetch the cats presentation from a Code Interpreter session.
+Uses the chunked file transfer API, so the file never passes through the agent,
+stdout or base64 text. Re-run to resume an interrupted download.
 """
-import json
-import uuid
-import boto3
-import base64
+import sys
 
-agent_arn = "arn:aws:bedrock-agentcore:eu-central-1:851725646055:runtime/claude_ci_agent-a4jvmjgbfa"
-agent_core_client = boto3.client("bedrock-agentcore", region_name="eu-central-1")
+from code_int_mcp.client import CodeInterpreterClient
 
-runtime_session_id = str(uuid.uuid4())
+code_int_session_id = sys.argv[1] if len(sys.argv) > 1 else "01KATM1PFJET8VFVAAT2BPH3FB"
+remote_path = "cats_presentation.pptx"
 
-# Ask agent to read file and output base64
-prompt = """Read the cats_presentation.pptx file from the Code Interpreter session,
-encode it as base64, and print ONLY the base64 string (no other text).
-Use this session ID: 01KATM1PFJET8VFVAAT2BPH3FB"""
+print(f"Downloading {remote_path} from session {code_int_session_id}...")
 
-payload = json.dumps({
-    "prompt": prompt,
-    "session_id": "01KATM1PFJET8VFVAAT2BPH3FB"
-}).encode()
+client = CodeInterpreterClient(pool_size=0)
+result = client.download_file(remote_path, "cats_presentation.pptx", code_int_session_id=code_int_session_id)
 
-print("Invoking agent to get base64 encoded presentation...")
-
-response = agent_core_client.invoke_agent_runtime(
-    agentRuntimeArn=agent_arn,
-    runtimeSessionId=runtime_session_id,
-    payload=payload,
-    qualifier="DEFAULT",
-)
-
-streaming_body = response.get("response")
-full_response = ""
-
-for chunk in streaming_body.iter_lines():
-    if chunk:
-        chunk_str = chunk.decode("utf-8")
-        if chunk_str.startswith("data:"):
-            data_str = chunk_str[5:].strip()
-            try:
-                data = json.loads(data_str)
-                if data.get("type") == "text":
-                    text_content = data.get("text", "")
-                    full_response += text_content
-                    print(text_content, end="", flush=True)
-            except json.JSONDecodeError:
-                pass
-
-print("\n\nFull response received. Saving to file...")
-
-# Try to extract base64 from response and decode
-lines = full_response.strip().split('\n')
-for line in lines:
-    line = line.strip()
-    # Look for a long base64 string
-    if len(line) > 100 and not line.startswith('#') and not line.startswith('```'):
-        try:
-            # Try to decode
-            decoded = base64.b64decode(line)
-            if decoded[:2] == b'PK':  # ZIP file magic bytes (PPTX is a ZIP)
-                with open('cats_presentation.pptx', 'wb') as f:
-                    f.write(decoded)
-                print(f"\n✅ Successfully decoded and saved cats_presentation.pptx ({len(decoded)} bytes)")
-                break
-        except:
-            continue
+if result.success:
+    print(f"✅ Successfully saved cats_presentation.pptx ({result.output['bytes']} bytes, sha256 {result.output['sha256']})")
+else:
+    print(f"❌ Download failed: {result.error}")
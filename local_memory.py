@@ -0,0 +1,270 @@
+"""Local SQLite stand-in for the MemorySessionManager subset used by the agent.
+
+Lets the memory hot path in agent.py be profiled and load-tested offline. Enable it with:
+
+    MEMORY_BACKEND=local
+    LOCAL_MEMORY_DB=/tmp/agent-memory.db   # default: local_memory.db
+    LOCAL_MEMORY_LATENCY_MS=40             # injected per-call latency (default: 0)
+    LOCAL_MEMORY_JITTER_MS=20              # extra random latency (default: 0)
+
+Seed it with synthetic data for benchmarking:
+
+    python local_memory.py --actors 20 --records 500 --turns 30
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Optional
+
+from memory_utils import content_terms
+
+SEMANTIC_STRATEGY_ID = "semantic_local-0001"
+EPISODIC_STRATEGY_ID = "episodic_local-0001"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    actor_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    messages TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_turns_session ON turns (actor_id, session_id, id);
+CREATE TABLE IF NOT EXISTS records (
+    memory_record_id TEXT PRIMARY KEY,
+    memory_strategy_id TEXT NOT NULL,
+    namespace TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_records_namespace ON records (namespace);
+"""
+
+
+class LocalMemorySessionManager:
+    """SQLite-backed implementation of the MemorySessionManager calls agent.py makes.
+
+    Implements get_last_k_turns, add_turns, list_long_term_memory_records and
+    search_long_term_memories with the same argument names and response shapes.
+    Searches use a lexical IDF-weighted term overlap score in [0, 1]. Every call
+    sleeps for `latency_ms` (+ up to `jitter_ms`) to mimic a remote backend.
+    """
+
+    def __init__(
+        self,
+        memory_id: str = "local",
+        db_path: str = "local_memory.db",
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+    ):
+        self.memory_id = memory_id
+        self.db_path = db_path
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, memory_id: str = "local") -> "LocalMemorySessionManager":
+        """Build a manager from the LOCAL_MEMORY_* environment variables."""
+        return cls(
+            memory_id=memory_id,
+            db_path=os.environ.get("LOCAL_MEMORY_DB", "local_memory.db"),
+            latency_ms=float(os.environ.get("LOCAL_MEMORY_LATENCY_MS", "0")),
+            jitter_ms=float(os.environ.get("LOCAL_MEMORY_JITTER_MS", "0")),
+        )
+
+    def _simulate_latency(self):
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    # --- Short-term memory -------------------------------------------------
+
+    def add_turns(self, actor_id: str, session_id: str, messages: list):
+        """Store one turn. Accepts ConversationalMessage objects or role/content dicts."""
+        self._simulate_latency()
+        stored = []
+        for msg in messages:
+            if isinstance(msg, dict):
+                role, text = msg.get("role", ""), msg.get("content", {}).get("text", "")
+            else:
+                role, text = msg.role, msg.text
+            stored.append({"role": getattr(role, "value", role), "content": {"text": text}})
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO turns (actor_id, session_id, created_at, messages) VALUES (?, ?, ?, ?)",
+                (actor_id, session_id, time.time(), json.dumps(stored)),
+            )
+            self._conn.commit()
+
+    def get_last_k_turns(self, actor_id: str, session_id: str, k: int = 5) -> List[list]:
+        """Return the last `k` turns, oldest first."""
+        self._simulate_latency()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT messages FROM turns WHERE actor_id = ? AND session_id = ? ORDER BY id DESC LIMIT ?",
+                (actor_id, session_id, k),
+            ).fetchall()
+        return [json.loads(row["messages"]) for row in reversed(rows)]
+
+    # --- Long-term memory --------------------------------------------------
+
+    def add_memory_record(self, namespace: str, strategy_id: str, text: str, record_id: Optional[str] = None) -> str:
+        """Insert a long-term memory record (used for seeding; not part of the SDK API)."""
+        record_id = record_id or f"mem-{uuid.uuid4().hex}"
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)",
+                (record_id, strategy_id, namespace, text, time.time()),
+            )
+            self._conn.commit()
+        return record_id
+
+    @staticmethod
+    def _to_record(row, score: Optional[float] = None) -> dict:
+        record = {
+            "memoryRecordId": row["memory_record_id"],
+            "memoryStrategyId": row["memory_strategy_id"],
+            "namespaces": [row["namespace"]],
+            "content": {"text": row["text"]},
+        }
+        if score is not None:
+            record["score"] = score
+        return record
+
+    def _rows_with_prefix(self, namespace_prefix: str, limit: Optional[int] = None) -> list:
+        escaped = namespace_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        sql = "SELECT * FROM records WHERE namespace LIKE ? ESCAPE '\\' ORDER BY created_at DESC"
+        params = [escaped + "%"]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def list_long_term_memory_records(self, namespace_prefix: str = "/", max_results: int = 10) -> List[dict]:
+        """List the newest records under `namespace_prefix`."""
+        self._simulate_latency()
+        return [self._to_record(row) for row in self._rows_with_prefix(namespace_prefix, max_results)]
+
+    def search_long_term_memories(self, query: str, namespace_prefix: str, top_k: int = 3) -> List[dict]:
+        """Lexical search under `namespace_prefix`, best `top_k` records by score."""
+        self._simulate_latency()
+        rows = self._rows_with_prefix(namespace_prefix)
+        query_terms = content_terms(query)
+        if not rows or not query_terms:
+            return []
+
+        doc_terms = [content_terms(row["text"]) for row in rows]
+        n = len(rows)
+        idf = {
+            term: math.log(1 + n / (1 + sum(1 for terms in doc_terms if term in terms)))
+            for term in query_terms
+        }
+        total = sum(idf.values())
+
+        scored = []
+        for row, terms in zip(rows, doc_terms):
+            matched = sum(weight for term, weight in idf.items() if term in terms)
+            if matched:
+                scored.append((matched / total, row))
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return [self._to_record(row, round(score, 4)) for score, row in scored[:top_k]]
+
+
+# --- Synthetic data for benchmarking ----------------------------------------
+
+_TOPICS = [
+    "pandas dataframe analysis", "matplotlib chart styling", "s3 bucket uploads",
+    "powerpoint presentation generation", "bitcoin price lookup", "compound interest calculation",
+    "csv sales report by region", "web scraping product prices", "jira ticket triage",
+    "weather forecast lookup", "sql query optimization", "docker image builds",
+]
+_PREFERENCES = ["prefers concise answers", "likes charts over tables", "works in EUR",
+                "uses Python 3.11", "wants code comments", "prefers dark themes"]
+
+
+def seed_synthetic_data(manager: LocalMemorySessionManager, actors: int, records: int, turns: int, sessions: int = 3):
+    """Populate `manager` with semantic facts, episodic records and turns per actor."""
+    rng = random.Random(42)
+    for a in range(actors):
+        actor_id = f"user-{a:03d}"
+        session_ids = [f"session-{a:03d}-{s}" for s in range(sessions)]
+        for _ in range(records):
+            topic = rng.choice(_TOPICS)
+            kind = rng.random()
+            if kind < 0.5:
+                manager.add_memory_record(
+                    f"/strategies/{SEMANTIC_STRATEGY_ID}/actors/{actor_id}",
+                    SEMANTIC_STRATEGY_ID,
+                    f"User {rng.choice(_PREFERENCES)} when working on {topic}.",
+                )
+            elif kind < 0.75:
+                manager.add_memory_record(
+                    f"/strategies/{EPISODIC_STRATEGY_ID}/actors/{actor_id}",
+                    EPISODIC_STRATEGY_ID,
+                    json.dumps({
+                        "title": f"Handling {topic}",
+                        "use_cases": f"Requests involving {topic}",
+                        "hints": f"Reuse the previous approach for {topic}",
+                    }),
+                )
+            else:
+                manager.add_memory_record(
+                    f"/strategies/{EPISODIC_STRATEGY_ID}/actors/{actor_id}/sessions/{rng.choice(session_ids)}",
+                    EPISODIC_STRATEGY_ID,
+                    json.dumps({
+                        "situation": f"User asked about {topic}",
+                        "intent": f"Get a working result for {topic}",
+                        "reflection": f"Running code first for {topic} avoided a retry",
+                    }),
+                )
+        for session_id in session_ids:
+            for t in range(turns):
+                topic = rng.choice(_TOPICS)
+                manager.add_turns(actor_id, session_id, [
+                    {"role": "USER", "content": {"text": f"Turn {t}: help me with {topic}"}},
+                    {"role": "ASSISTANT", "content": {"text": f"Here is how to handle {topic}. " * 10}},
+                ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed and benchmark the local memory backend")
+    parser.add_argument("--db", default=os.environ.get("LOCAL_MEMORY_DB", "local_memory.db"))
+    parser.add_argument("--actors", type=int, default=10)
+    parser.add_argument("--records", type=int, default=200, help="Long-term records per actor")
+    parser.add_argument("--turns", type=int, default=20, help="Turns per session")
+    parser.add_argument("--queries", type=int, default=100, help="Searches to time after seeding")
+    args = parser.parse_args()
+
+    manager = LocalMemorySessionManager(db_path=args.db)
+    start = time.perf_counter()
+    seed_synthetic_data(manager, args.actors, args.records, args.turns)
+    print(f"Seeded {args.db} in {time.perf_counter() - start:.1f}s")
+
+    rng = random.Random(7)
+    latencies = []
+    for _ in range(args.queries):
+        actor_id = f"user-{rng.randrange(args.actors):03d}"
+        start = time.perf_counter()
+        manager.search_long_term_memories(
+            rng.choice(_TOPICS), f"/strategies/{SEMANTIC_STRATEGY_ID}/actors/{actor_id}", top_k=5
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    if latencies:
+        print(f"search p50={latencies[len(latencies) // 2]:.2f}ms p95={latencies[int(len(latencies) * 0.95)]:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
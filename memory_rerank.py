@@ -0,0 +1,93 @@
+"""Local, network-free reranking of retrieved memories against the prompt."""
+
+import hashlib
+import logging
+from typing import List, Optional
+
+import numpy as np
+
+from memory_utils import LRUCache, content_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class HashingEmbedder:
+    """Feature-hashing bag of words/bigrams embedder with cached per-record vectors.
+
+    Terms are hashed into `dim` signed buckets and L2-normalized, so the cosine
+    similarity of two texts is a single dot product. Vectors for memory records are
+    cached by record ID (and reused while the text is unchanged).
+    """
+
+    def __init__(self, dim: int = 1024, cache_max_entries: int = 4096):
+        self.dim = dim
+        self._cache = LRUCache(max_entries=cache_max_entries)
+
+    def _features(self, text: str) -> list:
+        # Distinct words, plus bigrams of adjacent words in text order
+        tokens = content_tokens(text)
+        bigrams = {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+        return sorted(set(tokens)) + sorted(bigrams)
+
+    def embed(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vec[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def embed_record(self, record_id: Optional[str], text: str) -> np.ndarray:
+        """Embed a memory record, reusing the cached vector for its ID."""
+        if record_id:
+            cached = self._cache.get(record_id)
+            if cached is not None and cached[0] == text:
+                return cached[1]
+        vec = self.embed(text)
+        if record_id:
+            self._cache.put(record_id, (text, vec))
+        return vec
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+def rerank_memories(
+    embedder: HashingEmbedder,
+    prompt: str,
+    queries: List[str],
+    candidates: List[dict],
+    similarity_weight: float = 0.7,
+) -> List[dict]:
+    """Rescore candidate memories against the prompt and queries in one batched pass.
+
+    Each candidate is a dict with 'text', 'score' and optional 'memoryRecordId'. Its
+    local similarity is the best cosine similarity to the prompt or any query, and its
+    new 'score' blends that with the service score. All candidates are returned best
+    first with the original service score kept as 'service_score'; nothing is cut
+    here, the token budget in assemble_memory_context decides what fits.
+    """
+    if not candidates:
+        return []
+
+    texts = [prompt] + [q for q in queries if q and q != prompt]
+    query_matrix = np.stack([embedder.embed(t) for t in texts])
+    record_matrix = np.stack([embedder.embed_record(c.get('memoryRecordId'), c['text']) for c in candidates])
+
+    similarity = (record_matrix @ query_matrix.T).max(axis=1).clip(min=0.0)
+    service = np.array([float(c.get('score', 0.0)) for c in candidates], dtype=np.float32)
+    blended = similarity_weight * similarity + (1.0 - similarity_weight) * service
+
+    order = np.argsort(-blended, kind="stable")
+    reranked = [
+        {
+            **candidates[i],
+            'score': round(float(blended[i]), 4),
+            'service_score': candidates[i].get('score', 0.0),
+        }
+        for i in order
+    ]
+
+    logger.info(f"Reranked {len(candidates)} memories locally")
+    return reranked
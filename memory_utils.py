@@ -0,0 +1,809 @@
+"""Process-wide caches and helpers for AgentCore Memory retrieval."""
+
+import atexit
+import logging
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Substrings used to classify a memoryStrategyId into a strategy kind
+STRATEGY_KINDS = ("semantic", "episodic", "summary", "preference")
+
+
+class MemoryStrategyRegistry:
+    """Resolves and caches memory strategy IDs per memory ID.
+
+    A single `list_long_term_memory_records` call discovers every strategy kind at
+    once. Results (including kinds that were not found) are cached for `ttl_seconds`.
+    A failed listing is cached for the shorter `negative_ttl_seconds` so a broken
+    backend is not hammered on every request.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 600,
+        negative_ttl_seconds: float = 60,
+        max_records: int = 50,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_records = max_records
+        self._entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _resolve(self, manager) -> Dict[str, Optional[str]]:
+        """List records once and map each strategy kind to its first strategy ID."""
+        strategies = {kind: None for kind in STRATEGY_KINDS}
+        records = manager.list_long_term_memory_records(
+            namespace_prefix="/", max_results=self.max_records
+        )
+        for rec in records:
+            strategy_id = rec.get('memoryStrategyId', '')
+            for kind in STRATEGY_KINDS:
+                if strategies[kind] is None and kind in strategy_id.lower():
+                    strategies[kind] = strategy_id
+        return strategies
+
+    def get_strategies(self, manager, memory_id: str) -> Dict[str, Optional[str]]:
+        """Return the cached {kind: strategy_id} map, refreshing it if expired.
+
+        The lock is held across the listing so concurrent callers share one round trip.
+        """
+        with self._lock:
+            entry = self._entries.get(memory_id)
+            if entry and time.monotonic() < entry["expires_at"]:
+                return entry["strategies"]
+
+            try:
+                strategies = self._resolve(manager)
+                ttl = self.ttl_seconds
+                logger.info(f"Resolved memory strategies for {memory_id}: {strategies}")
+            except Exception as e:
+                logger.warning("Failed to resolve memory strategies: %s", e)
+                strategies = {kind: None for kind in STRATEGY_KINDS}
+                ttl = self.negative_ttl_seconds
+
+            self._entries[memory_id] = {
+                "strategies": strategies,
+                "expires_at": time.monotonic() + ttl,
+            }
+            return strategies
+
+    def get_strategy_id(self, manager, memory_id: str, kind: str) -> Optional[str]:
+        """Return the strategy ID for `kind` (e.g. 'semantic', 'episodic'), or None."""
+        return self.get_strategies(manager, memory_id).get(kind)
+
+    def invalidate(self, memory_id: Optional[str] = None):
+        """Drop the cached entry for `memory_id`, or all entries if None."""
+        with self._lock:
+            if memory_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(memory_id, None)
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query for cache keys (case and whitespace insensitive)."""
+    return " ".join(query.lower().split())
+
+
+def _estimate_size(records: list) -> int:
+    """Approximate in-memory size of search results in bytes."""
+    size = 0
+    for rec in records:
+        content = rec.get('content', {})
+        text = content.get('text', '') if isinstance(content, dict) else str(content)
+        size += len(text) + 256  # Fixed overhead for IDs, namespaces and scores
+    return size
+
+
+class SearchResultCache:
+    """Bounded, size-aware LRU cache with TTL for long-term memory search results.
+
+    Entries are keyed by (namespace, normalized query, top_k) and indexed by actor
+    so that all of an actor's results can be invalidated when new turns are stored.
+    """
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 4 * 1024 * 1024, ttl_seconds: float = 120):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._actor_keys: Dict[str, set] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._miss_latency_total = 0.0
+
+    @staticmethod
+    def make_key(namespace: str, query: str, top_k: int) -> tuple:
+        return (namespace, normalize_query(query), top_k)
+
+    def _remove(self, key: tuple):
+        entry = self._entries.pop(key)
+        self._bytes -= entry["size"]
+        keys = self._actor_keys.get(entry["actor_id"])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._actor_keys[entry["actor_id"]]
+
+    def get(self, key: tuple) -> Optional[list]:
+        """Return cached results for `key`, or None on a miss or expired entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.monotonic() >= entry["expires_at"]:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["records"]
+
+    def put(self, key: tuple, actor_id: str, records: list, fetch_seconds: float = 0.0):
+        """Store results for `key`, evicting least recently used entries to stay in bounds."""
+        size = _estimate_size(records)
+        with self._lock:
+            self._miss_latency_total += fetch_seconds
+            if size > self.max_bytes:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                "records": records,
+                "actor_id": actor_id,
+                "size": size,
+                "expires_at": time.monotonic() + self.ttl_seconds,
+            }
+            self._actor_keys.setdefault(actor_id, set()).add(key)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_actor(self, actor_id: str) -> int:
+        """Drop every cached result belonging to `actor_id`. Returns entries removed."""
+        with self._lock:
+            keys = list(self._actor_keys.get(actor_id, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and the backend latency saved by cache hits."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            avg_miss_ms = (self._miss_latency_total / self.misses * 1000) if self.misses else 0.0
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "avg_miss_ms": round(avg_miss_ms, 1),
+                "estimated_saved_ms": round(self.hits * avg_miss_ms, 1),
+            }
+
+
+def _first_sentence(text: str, max_chars: int) -> str:
+    """Collapse whitespace and cut text to its first sentence within `max_chars`."""
+    text = " ".join(text.split())
+    match = re.search(r"[.!?](\s|$)", text)
+    if match and match.end() <= max_chars:
+        return text[:match.end()].strip()
+    return text if len(text) <= max_chars else text[:max_chars - 3].rstrip() + "..."
+
+
+def summarize_turn(turn: list) -> str:
+    """Extractive one-line summary of a stored turn (list of role/content messages)."""
+    parts = []
+    for msg in turn:
+        text = msg.get('content', {}).get('text', '')
+        if not text:
+            continue
+        if msg.get('role', '').lower() in ('user', 'human'):
+            parts.append(f"User asked: {_first_sentence(text, 120)}")
+        else:
+            parts.append(f"Assistant: {_first_sentence(text, 160)}")
+    return " | ".join(parts)
+
+
+class STMBuffer:
+    """Write-through ring buffer of recent conversation turns per (actor, session).
+
+    A session becomes warm once it is seeded from the remote backend; after that,
+    `append` keeps it current and reads never leave the process. Sessions idle for
+    longer than `idle_ttl_seconds`, or beyond `max_sessions` (least recently used
+    first), are evicted so memory use stays flat.
+
+    Only the newest `max_turns` are kept verbatim. When a `summarizer` is given,
+    turns that fall out of that window are folded into a rolling per-session
+    summary of at most `summary_max_lines` lines. Folding happens only on
+    `seed`/`append`, so reads never recompute it.
+    """
+
+    def __init__(
+        self,
+        max_turns: int = 10,
+        max_sessions: int = 1000,
+        idle_ttl_seconds: float = 1800,
+        summarizer: Optional[Callable[[list], str]] = None,
+        summary_max_lines: int = 20,
+    ):
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.summarizer = summarizer
+        self.summary_max_lines = summary_max_lines
+        self._sessions: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_idle(self, now: float):
+        """Drop idle sessions (oldest first) and enforce the session bound."""
+        while self._sessions:
+            key, entry = next(iter(self._sessions.items()))
+            if now - entry["last_access"] < self.idle_ttl_seconds and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[key]
+
+    def _push(self, entry: dict, turn: list):
+        """Append a turn, folding the oldest verbatim turn into the summary if full."""
+        turns = entry["turns"]
+        if len(turns) == self.max_turns and turns and self.summarizer is not None:
+            line = self.summarizer(turns[0])
+            if line:
+                entry["summary"].append(line)
+        turns.append(turn)
+
+    def get(self, actor_id: str, session_id: str, k: int) -> Optional[list]:
+        """Return the last `k` buffered turns, or None if the session is cold."""
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._sessions.get((actor_id, session_id))
+            if entry is None:
+                return None
+            entry["last_access"] = now
+            self._sessions.move_to_end((actor_id, session_id))
+            return list(entry["turns"])[-k:] if k > 0 else []
+
+    def summary(self, actor_id: str, session_id: str) -> list:
+        """Return the rolling summary lines (oldest first) for a warm session."""
+        with self._lock:
+            entry = self._sessions.get((actor_id, session_id))
+            return list(entry["summary"]) if entry else []
+
+    def seed(self, actor_id: str, session_id: str, turns: list):
+        """Warm a session with turns fetched from the remote backend (oldest first)."""
+        now = time.monotonic()
+        entry = {
+            "turns": deque(maxlen=self.max_turns),
+            "summary": deque(maxlen=self.summary_max_lines),
+            "last_access": now,
+        }
+        for turn in turns or []:
+            self._push(entry, turn)
+        with self._lock:
+            self._sessions[(actor_id, session_id)] = entry
+            self._sessions.move_to_end((actor_id, session_id))
+            self._evict_idle(now)
+
+    def append(self, actor_id: str, session_id: str, turn: list) -> bool:
+        """Record a newly stored turn. Cold sessions are left for the next seed."""
+        with self._lock:
+            entry = self._sessions.get((actor_id, session_id))
+            if entry is None:
+                return False
+            self._push(entry, turn)
+            entry["last_access"] = time.monotonic()
+            self._sessions.move_to_end((actor_id, session_id))
+            return True
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+
+class WriteBehindQueue:
+    """Bounded background queue that persists items off the response path.
+
+    A single daemon worker thread calls `writer(item)` for each queued item,
+    retrying failures with exponential backoff. `shutdown` drains the queue and is
+    registered with atexit when the worker starts, so pending writes are flushed
+    when the process exits.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        writer: Callable[[Any], None],
+        name: str = "write-behind",
+        max_size: int = 1000,
+        max_retries: int = 3,
+        backoff_seconds: float = 0.5,
+    ):
+        self.writer = writer
+        self.name = name
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_size)
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.retries = 0
+        self.rejected = 0
+        self._write_seconds_total = 0.0
+        self.last_write_ms = 0.0
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+                atexit.register(self.shutdown)
+
+    def put(self, item) -> bool:
+        """Queue an item for writing. Returns False if the queue is full."""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.rejected += 1
+            logger.warning(f"[{self.name}] queue full ({self._queue.maxsize}), rejecting write")
+            return False
+        self.enqueued += 1
+        return True
+
+    def _write(self, item):
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                self.writer(item)
+                elapsed = time.perf_counter() - start
+                self._write_seconds_total += elapsed
+                self.last_write_ms = round(elapsed * 1000, 1)
+                self.written += 1
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    logger.warning(f"[{self.name}] write failed after {attempt + 1} attempts: {e}")
+                    return
+                self.retries += 1
+                delay = self.backoff_seconds * (2 ** attempt)
+                logger.info(f"[{self.name}] write failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is self._STOP:
+                    return
+                self._write(item)
+            finally:
+                self._queue.task_done()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued item has been written (or `timeout` elapses)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def shutdown(self, timeout: float = 10.0):
+        """Flush pending writes and stop the worker."""
+        with self._lock:
+            worker = self._worker
+            self._worker = None
+        if worker is None or not worker.is_alive():
+            return
+        pending = self._queue.qsize()
+        if pending:
+            logger.info(f"[{self.name}] flushing {pending} pending writes on shutdown")
+        self._queue.put(self._STOP)
+        worker.join(timeout)
+
+    def stats(self) -> dict:
+        """Queue depth and write latency metrics."""
+        return {
+            "depth": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "failed": self.failed,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "avg_write_ms": round(self._write_seconds_total / self.written * 1000, 1) if self.written else 0.0,
+            "last_write_ms": self.last_write_ms,
+        }
+
+
+class LRUCache:
+    """Small thread-safe LRU cache with optional TTL and hit/miss counters."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[1] is not None and time.monotonic() >= entry[1]):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+# Words that carry no retrieval signal (function words and request phrasing)
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before
+being below between both but by can could did do does doing down during each few for from
+further had has have having he her here hers herself him himself his how i if in into is it
+its itself just let me more most my myself no nor not now of off on once only or other our
+ours ourselves out over own same she should so some such than that the their theirs them
+themselves then there these they this those through to too under until up very was we were
+what when where which while who whom why will with would you your yours yourself yourselves
+please help tell show give make want need like know get got use using find run create write
+thanks thank hi hello hey ok okay sure something anything thing things way lot
+""".split())
+
+# Words that point back at earlier context and make a prompt ambiguous on its own
+DEICTIC_WORDS = frozenset("it that this those these them same again previous last earlier above before".split())
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9_\-.$%]*")
+_QUOTED_RE = re.compile(r"[\"“']([^\"”']{3,60})[\"”']")
+
+
+def extract_keywords(prompt: str, limit: int = 8) -> list:
+    """Return content keywords ordered by frequency, then first occurrence."""
+    counts: Dict[str, int] = {}
+    for token in _TOKEN_RE.findall(prompt.lower()):
+        token = token.strip(".-_")
+        if len(token) < 3 or token in STOPWORDS:
+            continue
+        counts[token] = counts.get(token, 0) + 1
+    ranked = sorted(counts, key=lambda t: -counts[t])  # sorted() is stable
+    return ranked[:limit]
+
+
+def extract_entities(prompt: str, limit: int = 4) -> list:
+    """Return quoted phrases, capitalized names and identifier-like tokens."""
+    entities = [m.strip() for m in _QUOTED_RE.findall(prompt)]
+    run = []
+    for match in list(_TOKEN_RE.finditer(prompt)) + [None]:
+        token = match.group().rstrip(".") if match else ""
+        sentence_start = match is not None and prompt[:match.start()].rstrip()[-1:] in ("", ".", "!", "?")
+        is_name = (
+            token[:1].isupper()
+            and token.lower() not in STOPWORDS
+            and (run or not sentence_start or token.isupper())
+        )
+        if is_name:
+            run.append(token)
+            continue
+        if run:
+            entities.append(" ".join(run))
+            run = []
+        has_digit = any(c.isdigit() for c in token)
+        has_alpha = any(c.isalpha() for c in token)
+        if has_alpha and (has_digit or any(c in "_." for c in token)):
+            entities.append(token)
+    unique = []
+    for entity in entities:
+        if entity.lower() not in (u.lower() for u in unique):
+            unique.append(entity)
+    return unique[:limit]
+
+
+def heuristic_memory_queries(prompt: str, max_queries: int = 3) -> list:
+    """Deterministic, model-free search queries covering intent, preferences and entities."""
+    keywords = extract_keywords(prompt)
+    entities = extract_entities(prompt)
+    candidates = []
+    if keywords:
+        candidates.append(" ".join(keywords[:5]))
+    if entities:
+        candidates.append(" ".join(entities))
+    if keywords:
+        candidates.append(f"user preferences {' '.join(keywords[:2])}")
+
+    queries = []
+    seen = {normalize_query(prompt)}
+    for query in candidates:
+        normalized = normalize_query(query)
+        if normalized and normalized not in seen:
+            seen.add(normalized)
+            queries.append(query)
+    return queries[:max_queries]
+
+
+def needs_llm_queries(prompt: str, heuristic_queries: list, llm_min_words: int = 60) -> bool:
+    """True when a prompt is long or too ambiguous for keyword extraction."""
+    words = prompt.lower().split()
+    if len(words) >= llm_min_words:
+        return True
+    if not heuristic_queries:
+        return len(words) > 3
+    keywords = extract_keywords(prompt)
+    deictic = sum(1 for w in words if w.strip("?.!,") in DEICTIC_WORDS)
+    return len(keywords) < 2 and deictic > 0
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate Claude token count at ~4 characters per token.
+
+    This is an estimate for budgeting, not the model's tokenizer; English prose is
+    usually within ~20% of the real count.
+    """
+    if not text:
+        return 0
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut `text` to fit `max_tokens` (as estimated), at a word boundary when one is
+    close, marking the cut with an ellipsis."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    limit = max(max_tokens * 4 - 1, 0)
+    cut = text[:limit]
+    boundary = max(cut.rfind(" "), cut.rfind("\n"))
+    if boundary >= limit * 0.8:
+        cut = cut[:boundary]
+    return cut.rstrip() + "…"
+
+
+def content_tokens(text: str) -> list:
+    """Lowercased content words (3+ chars, stopwords removed) in text order."""
+    return [
+        t for t in (tok.strip(".-_") for tok in _TOKEN_RE.findall(text.lower()))
+        if len(t) >= 3 and t not in STOPWORDS
+    ]
+
+
+def content_terms(text: str) -> frozenset:
+    """Distinct content words (see content_tokens) used for overlap scoring."""
+    return frozenset(content_tokens(text))
+
+
+def _similarity(a: frozenset, b: frozenset) -> float:
+    """Overlap coefficient, so a short fact restated inside a longer line still matches."""
+    if len(a) < 3 or len(b) < 3:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def assemble_memory_context(
+    sections: list,
+    max_tokens: int,
+    dedupe_similarity: float = 0.8,
+    min_trimmed_tokens: int = 16,
+) -> tuple:
+    """Fit memory sections into a single (estimated) token budget.
+
+    Each section is a dict with 'name', 'header', 'items' and optional 'dedupe'.
+    Items are dicts with 'text', 'score', 'order' and optional 'required'. Required
+    items are admitted first, then the rest greatest score first (a section's header
+    is charged with its first item). An item that does not fit is cut down to the
+    remaining budget instead of skipped, as long as at least `min_trimmed_tokens`
+    remain (required items are always admitted, trimmed if needed). Items in dedupe
+    sections that repeat an already admitted fact from another dedupe section are
+    dropped. Admitted items are rendered in their 'order' within each section.
+
+    Returns:
+        ({section name: rendered text}, usage dict)
+    """
+    candidates = []
+    for section in sections:
+        for item in section["items"]:
+            candidates.append((item["score"], section, item))
+    candidates.sort(key=lambda c: (bool(c[2].get("required")), c[0]), reverse=True)
+
+    admitted: Dict[str, list] = {section["name"]: [] for section in sections}
+    admitted_terms = []  # (section name, terms) of admitted dedupe items
+    used = 0
+    trimmed = 0
+    dropped = {"budget": 0, "duplicate": 0}
+
+    for score, section, item in candidates:
+        name = section["name"]
+        if section.get("dedupe"):
+            terms = content_terms(item["text"])
+            if any(
+                other != name and _similarity(terms, other_terms) >= dedupe_similarity
+                for other, other_terms in admitted_terms
+            ):
+                dropped["duplicate"] += 1
+                continue
+        header_cost = 0 if admitted[name] else estimate_tokens(section["header"]) + 1
+        cost = header_cost + estimate_tokens(item["text"]) + 1  # +1 for the joining newline
+        if used + cost > max_tokens:
+            room = max_tokens - used - header_cost - 1
+            if room < (1 if item.get("required") else min_trimmed_tokens):
+                dropped["budget"] += 1
+                continue
+            item = {**item, "text": truncate_to_tokens(item["text"], room)}
+            cost = header_cost + estimate_tokens(item["text"]) + 1
+            trimmed += 1
+        used += cost
+        admitted[name].append(item)
+        if section.get("dedupe"):
+            admitted_terms.append((name, terms))
+
+    rendered = {}
+    for section in sections:
+        items = sorted(admitted[section["name"]], key=lambda i: i["order"])
+        rendered[section["name"]] = (
+            section["header"] + "\n" + "\n".join(i["text"] for i in items) + "\n" if items else ""
+        )
+
+    usage = {
+        "tokens": used,
+        "max_tokens": max_tokens,
+        "items": {name: len(items) for name, items in admitted.items()},
+        "trimmed": trimmed,
+        "dropped": dropped,
+    }
+    return rendered, usage
+
+
+class BackgroundDigestCache:
+    """Per-key precomputed digests maintained by a background refresh thread.
+
+    `get` never blocks on a build: it returns the current digest (or None) and
+    registers the key as active. A daemon worker builds missing digests right away
+    and rebuilds active ones every `refresh_interval_seconds` by calling
+    `builder(key, previous_digest)`, so builders can refresh incrementally. Keys not
+    read for `idle_ttl_seconds` stop being refreshed and are dropped.
+    """
+
+    def __init__(
+        self,
+        builder: Callable[[str, Optional[dict]], Optional[dict]],
+        name: str = "digest-refresher",
+        refresh_interval_seconds: float = 300,
+        idle_ttl_seconds: float = 3600,
+        max_keys: int = 1000,
+    ):
+        self.builder = builder
+        self.name = name
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_keys = max_keys
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._pending: "deque[str]" = deque()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self.builds = 0
+        self.failures = 0
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._worker.start()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the precomputed digest for `key` (None until first built)."""
+        now = time.monotonic()
+        with self._lock:
+            self._ensure_worker()
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {"digest": None, "built_at": None, "last_access": now}
+                self._entries[key] = entry
+                self._pending.append(key)
+                self._wakeup.set()
+                while len(self._entries) > self.max_keys:
+                    self._entries.popitem(last=False)
+            entry["last_access"] = now
+            self._entries.move_to_end(key)
+            return entry["digest"]
+
+    def request_refresh(self, key: str):
+        """Schedule an out-of-band rebuild for an active key."""
+        with self._lock:
+            if key in self._entries:
+                self._pending.append(key)
+                self._wakeup.set()
+
+    def _due_keys(self, now: float) -> list:
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if now - e["last_access"] > self.idle_ttl_seconds]:
+                del self._entries[key]
+            due = list(dict.fromkeys(k for k in self._pending if k in self._entries))
+            self._pending.clear()
+            due += [
+                k for k, e in self._entries.items()
+                if k not in due and e["built_at"] is not None
+                and now - e["built_at"] >= self.refresh_interval_seconds
+            ]
+            return due
+
+    def _build(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            previous = entry["digest"] if entry else None
+        try:
+            digest = self.builder(key, previous)
+            self.builds += 1
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"[{self.name}] failed to build digest for {key}: {e}")
+            digest = previous
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["digest"] = digest
+                entry["built_at"] = time.monotonic()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(timeout=min(self.refresh_interval_seconds, 60))
+            self._wakeup.clear()
+            for key in self._due_keys(time.monotonic()):
+                self._build(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "keys": len(self._entries),
+                "ready": sum(1 for e in self._entries.values() if e["digest"] is not None),
+                "builds": self.builds,
+                "failures": self.failures,
+            }